@@ -16,7 +16,9 @@ MPM_SRC_FILES = tuple(
         "filesystem/ftp.py",
         "filesystem/local.py",
         "manager/__init__.py",
+        "manager/cache.py",
         "manager/common.py",
+        "manager/prefetch.py",
         "manager/release.py",
         "manager/snapshot.py",
         "manager/update.py",
@@ -24,12 +26,22 @@ MPM_SRC_FILES = tuple(
         "manifest/common.py",
         "manifest/curse.py",
         "manifest/pack.py",
+        "network/__init__.py",
+        "network/cache.py",
+        "network/common.py",
+        "network/download.py",
+        "network/jars.py",
+        "network/metrics.py",
+        "network/mirrors.py",
+        "network/ratelimit.py",
+        "network/retry.py",
+        "network/session.py",
+        "network/twitch.py",
         "ui/__init__.py",
         "ui/packmodes.py",
         "ui/widgets.py",
         "__init__.py",
         "_filelist.py",
-        "network.py",
         "utils.py",
     )
 )
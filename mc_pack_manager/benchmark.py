@@ -0,0 +1,181 @@
+"""
+Offline benchmarks of the network-bound operations, against a local fake Curse API
+(see network.fakeserver). Run with:
+
+    python -m mc_pack_manager.benchmark resolve --mods 300 --latency 0.05 --jobs 1 4 16
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import argparse
+import json
+import logging
+from pathlib import Path
+import tempfile
+import time
+from typing import Sequence
+import zipfile
+
+# Local import
+from . import manager
+from . import network
+from . import utils
+from .network.fakeserver import FakeCurseServer, Fixtures
+
+LOGGER = utils.getLogger(__name__)
+
+
+def _reset():
+    """
+    Empties the in-memory caches so that each run starts cold
+    """
+    with network.TwitchAPI.CACHE_LOCK:
+        network.TwitchAPI.MOD_CACHE.clear()
+        network.TwitchAPI.FILE_CACHE.clear()
+        network.TwitchAPI.URL_CACHE.clear()
+        network.TwitchAPI.URL_IDS.clear()
+
+
+def resolve(server: FakeCurseServer, jobs: int, mods: int = None):
+    """
+    Resolves a whole new modlist, as 'mpm snapshot' does for a new pack
+    """
+    manager.common.build_new_modlist(
+        {"mods": []}, server.fixtures.curse_manifest(mods), jobs=jobs
+    )
+
+
+def prefetch(server: FakeCurseServer, jobs: int, mods: int = None):
+    """
+    Downloads every jar of a snapshot into an empty jar store
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        snapshot = tmp / "snapshot.zip"
+        with zipfile.ZipFile(snapshot, "w") as zf:
+            zf.writestr(
+                "pack-manifest.json",
+                json.dumps(server.fixtures.pack_manifest(mods, packmode="server")),
+            )
+        network.configure(cache_dir=tmp / "cache", api_rate=None, cdn_rate=None)
+        _reset()
+        try:
+            manager.prefetch.prefetch(snapshot, jobs=jobs)
+        finally:
+            # Release the stores before their directory is removed
+            network.close()
+
+
+def serverfiles(server: FakeCurseServer, jobs: int, mods: int = None):
+    """
+    Builds server files from a snapshot, downloading every jar
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        snapshot = tmp / "snapshot.zip"
+        with zipfile.ZipFile(snapshot, "w") as zf:
+            zf.writestr(
+                "pack-manifest.json",
+                json.dumps(server.fixtures.pack_manifest(mods, packmode="server")),
+            )
+            zf.writestr(
+                "manifest.json", json.dumps(server.fixtures.curse_manifest(mods))
+            )
+            zf.writestr("overrides/", "")
+        manager.release.serverfiles(snapshot, tmp / "server.zip", jobs=jobs)
+
+
+SCENARIOS = {"prefetch": prefetch, "resolve": resolve, "serverfiles": serverfiles}
+
+
+def run(
+    scenario: str,
+    jobs: Sequence[int] = (1, 4, 16),
+    mods: int = 300,
+    jar_size: int = 256 * 1024,
+    repeat: int = 1,
+    **server_options
+) -> list:
+    """
+    Runs a scenario with several job counts against a fresh fake server
+
+    Arguments
+        scenario -- name of the scenario, a key of SCENARIOS
+        jobs -- the job counts to measure
+        mods -- number of mods in the pack
+        jar_size -- average size of the jars, in bytes
+        repeat -- number of runs per job count, the best one is kept
+        server_options -- passed to FakeCurseServer (latency, bandwidth...)
+
+    Returns
+        A list of (jobs, seconds, requests) tuples
+    """
+    function = SCENARIOS[scenario]
+    results = []
+    with FakeCurseServer(Fixtures(mods, jar_size), **server_options) as server:
+        root = network.TwitchAPI.ROOT
+        network.TwitchAPI.ROOT = server.root
+        try:
+            for job_count in jobs:
+                best = None
+                for _ in range(repeat):
+                    # No persistent caches nor rate limits, only measure the network
+                    network.configure(cache_dir=None, api_rate=None, cdn_rate=None)
+                    _reset()
+                    server.reset_counts()
+                    start = time.perf_counter()
+                    function(server, job_count, mods)
+                    elapsed = time.perf_counter() - start
+                    network.close()
+                    if best is None or elapsed < best[1]:
+                        best = (job_count, elapsed, server.total_requests())
+                LOGGER.info("%s with %s jobs: %.2fs, %s requests", scenario, *best)
+                results.append(best)
+        finally:
+            network.TwitchAPI.ROOT = root
+            _reset()
+    return results
+
+
+def main(argv: Sequence[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("-j", "--jobs", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--mods", type=int, default=300, help="number of mods")
+    parser.add_argument(
+        "--jar-size", type=utils.parse_size, default=256 * 1024, help="e.g. 256K"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="server latency, in seconds"
+    )
+    parser.add_argument(
+        "--bandwidth", type=utils.parse_size, help="per download, e.g. 1M"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--no-batch",
+        action="store_false",
+        dest="batch",
+        help="resolve mods one by one, as with an API without batch endpoints",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    results = run(
+        args.scenario,
+        jobs=args.jobs,
+        mods=args.mods,
+        jar_size=args.jar_size,
+        repeat=args.repeat,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        batch=args.batch,
+    )
+    print("%-8s %10s %10s" % ("jobs", "seconds", "requests"))
+    for job_count, elapsed, requests in results:
+        print("%-8s %10.2f %10s" % (job_count, elapsed, requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ from functools import wraps
 import logging
 from pathlib import PurePath
 import tempfile
-from typing import Union
+from typing import Iterable, Union
 
 # Local imports
 from .. import utils
@@ -60,6 +60,34 @@ class FileSystem(ABC):
         """
         Context manager implementation
         """
+        self.close()
+
+    def close(self):
+        """
+        Releases the resources held by the filesystem
+        """
+
+    def clone(self) -> "FileSystem":
+        """
+        Returns a filesystem object on the same root, that can be used from another
+        thread concurrently with this one. Clones must be closed with close() when no
+        longer needed, unless they are this very object
+
+        The default implementation returns self, for filesystems that are thread-safe
+        """
+        return self
+
+    def make_dirs(self, paths: Iterable[PathLike]):
+        """
+        Creates directories and their missing parents, e.g. before a batch of
+        uploads. Filesystems create the parents of the files they write anyway, this
+        lets them do it once for the whole batch
+
+        The default implementation does nothing
+
+        Arguments
+            paths -- iterable of directories relative to base_dir
+        """
 
     @abstractmethod
     def exists(self, path: PathLike):
@@ -127,14 +155,24 @@ class FileSystem(ABC):
         """
 
     @abstractmethod
-    def download(self, url: str, dest: PathLike, force: bool = False):
+    def download(
+        self,
+        url: str,
+        dest: PathLike,
+        force: bool = False,
+        checksum: str = None,
+        size: int = None,
+    ):
         """
-        Downloads a file from the web into the filesystem
+        Downloads a file from the web into the filesystem. dest is left untouched
+        if the download fails or doesn't match checksum and size
 
         Arguments
             url -- url of the file to download
             dest -- destination file
             force -- overwrite destination file if it exists
+            checksum -- expected "<algorithm>:<hex digest>" of the file, if known
+            size -- expected size of the file in bytes, if known
         """
 
     @abstractmethod
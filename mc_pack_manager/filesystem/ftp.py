@@ -4,19 +4,54 @@ Remote FTP filesystem implementation
 Part of the Minecraft Pack Manager utility (mpm)
 """
 # Standard library imports
+import contextlib
 import ftplib
+import functools
+import hashlib
+import io
+import json
 import logging
 from pathlib import Path, PurePath
-import requests
 import tempfile
+import threading
+import time
+from typing import Callable, Optional
 import urllib.parse
 
 # Local import
+from .. import network
 from .. import utils
 from ..filesystem import common
 
 LOGGER = utils.getLogger(__name__)
 
+# Number of connections opened at most to the FTP server
+DEFAULT_POOL_SIZE = 4
+# Seconds after which an idle connection is checked before being reused
+IDLE_CHECK_DELAY = 30.0
+# Attempts of an upload interrupted by connection failures, each resuming the last
+UPLOAD_ATTEMPTS = 3
+# Size from which uploads go through a .part file that later runs can resume
+RESUMABLE_SIZE = 1024 * 1024
+# Sidecar file at the root of the filesystem, recording the hashes of the uploads
+HASH_RECORD_FILE = ".mpm-hashes.json"
+# hashlib names of the algorithms of the HASH command (draft-bryan-ftpext-hash)
+HASH_ALGORITHMS = {
+    "SHA-256": "sha256",
+    "SHA-512": "sha512",
+    "SHA-1": "sha1",
+    "MD5": "md5",
+}
+# hashlib names of the algorithms of the non-standard X<algorithm> commands
+X_HASH_COMMANDS = {
+    "XSHA256": "sha256",
+    "XSHA512": "sha512",
+    "XSHA1": "sha1",
+    "XMD5": "md5",
+}
+# Order in which the algorithms are used to compare files
+HASH_PREFERENCE = ("sha256", "sha512", "sha1", "md5")
+
 
 class FTPPermissionError(common.FileSystemBaseError, utils.AutoFormatError):
     """
@@ -29,9 +64,618 @@ class FTPPermissionError(common.FileSystemBaseError, utils.AutoFormatError):
         self.err = err
 
 
+class FTPUploadError(common.FileSystemBaseError, utils.AutoFormatError):
+    """
+    An uploaded file doesn't have the expected content on the server
+    """
+
+    def __init__(
+        self,
+        path,
+        expected,
+        actual,
+        message="Upload of {path} is corrupted: expected {expected}, got {actual}",
+    ):
+        super().__init__(message)
+        self.path = path
+        self.expected = expected
+        self.actual = actual
+        self.message = message
+
+
+class FTPConnectionPool:
+    """
+    Pool of authenticated connections to a FTP server. Each connection has its own
+    working directory, and is only used by one thread at a time
+
+    Connections are opened when needed, up to size. Connections that broke are
+    dropped, and connections left idle for a while are checked before reuse
+    """
+
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        passwd: str,
+        use_tls: bool = False,
+        port: int = None,
+        size: int = DEFAULT_POOL_SIZE,
+    ):
+        """
+        Arguments
+            host, user, passwd, use_tls -- see FTPFileSystem
+            port -- port of the server. Defaults to the FTP port
+            size -- maximum number of open connections
+        """
+        self.host = host
+        self.user = user
+        self.passwd = passwd
+        self.use_tls = use_tls
+        self.port = port
+        self.size = max(1, size)
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.size)
+        # (connection, time it was released) of the idle connections
+        self.idle = []
+        # Metrics
+        self.opened = 0
+
+    def connect(self) -> ftplib.FTP:
+        """
+        Opens and authenticates a new connection
+        """
+        ftp = ftplib.FTP_TLS() if self.use_tls else ftplib.FTP()
+        # ftplib keeps its default port for 0
+        ftp.connect(self.host, self.port or 0)
+        ftp.login(user=self.user, passwd=self.passwd)
+        if self.use_tls:
+            ftp.prot_p()
+        with self.lock:
+            self.opened += 1
+        LOGGER.debug("Opened FTP connection %s to %s", self.opened, self.host)
+        return ftp
+
+    def _reuse(self) -> Optional[ftplib.FTP]:
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                ftp, released = self.idle.pop()
+            if time.monotonic() - released < IDLE_CHECK_DELAY:
+                return ftp
+            try:
+                ftp.voidcmd("NOOP")
+                return ftp
+            except (*ftplib.all_errors, EOFError):
+                LOGGER.debug("Dropping a stale FTP connection")
+                self._discard(ftp)
+
+    @staticmethod
+    def _discard(ftp: ftplib.FTP):
+        try:
+            ftp.close()
+        except (*ftplib.all_errors, EOFError):
+            pass
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Context manager holding a connection of the pool, waiting for one to be
+        available if needed. Yields a ConnectionLease
+        """
+        with self.slots:
+            lease = ConnectionLease(self, self._reuse() or self.connect())
+            try:
+                yield lease
+            except (OSError, EOFError, ftplib.error_temp):
+                # The connection may be unusable, don't give it to someone else
+                self._discard(lease.ftp)
+                raise
+            except BaseException:
+                self._release(lease)
+                raise
+            else:
+                self._release(lease)
+
+    def _release(self, lease: "ConnectionLease"):
+        if lease.broken:
+            self._discard(lease.ftp)
+        else:
+            with self.lock:
+                self.idle.append((lease.ftp, time.monotonic()))
+
+    def close(self):
+        """
+        Closes the idle connections
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for ftp, _ in idle:
+            try:
+                ftp.quit()
+            except (*ftplib.all_errors, EOFError):
+                self._discard(ftp)
+
+
+class ConnectionLease:
+    """
+    A connection of a FTPConnectionPool held by a thread, see
+    FTPConnectionPool.connection()
+    """
+
+    def __init__(self, pool: FTPConnectionPool, ftp: ftplib.FTP):
+        self.pool = pool
+        self.ftp = ftp
+        self.broken = False
+
+    def renew(self) -> ftplib.FTP:
+        """
+        Replaces the connection with a new one, after it failed
+        """
+        self.broken = True
+        self.pool._discard(self.ftp)
+        self.ftp = self.pool.connect()
+        self.broken = False
+        return self.ftp
+
+
+def _pooled(method):
+    """
+    Runs a FTPFileSystem method with a connection of the pool, available as
+    self.ftp. Nested calls reuse the connection of the calling thread
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._connection():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class RemoteIndex:
+    """
+    In-memory index of a remote FTP tree, built from MLSD listings
+
+    Directories are listed the first time something in them is looked up, so that
+    existence and type checks of their content are answered from memory. The
+    FTPFileSystem keeps the index up to date with its own modifications. Changes
+    made to the server by other means require an explicit invalidate()
+
+    The object is safe to share between the connections of several threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Remote path -> MLSD facts of the entry
+        self.entries = {}
+        # Directories whose whole content is in entries
+        self.listed = set()
+        # Directory -> paths of entries and listed below it, at any depth
+        self.below = {}
+        # Metrics
+        self.listings = 0
+
+    def _list(self, ftp: ftplib.FTP, directory: PurePath) -> dict:
+        """
+        Indexes the content of a remote directory
+
+        Returns
+            The MLSD facts of the entries of the directory, by path
+        """
+        LOGGER.debug("Listing remote directory %s", directory)
+        content = {}
+        for name, facts in ftp.mlsd(directory.as_posix()):
+            kind = facts.get("type", "").lower()
+            if kind in ("cdir", "pdir"):
+                continue
+            facts["type"] = kind
+            content[directory / name] = facts
+        with self.lock:
+            self.listings += 1
+            self.entries.update(content)
+            self.listed.add(directory)
+            for path in (directory, *content):
+                self._track(path)
+        return content
+
+    def stat(self, ftp: ftplib.FTP, path: PurePath) -> Optional[dict]:
+        """
+        Returns the MLSD facts of a remote path, or None if it doesn't exist. The
+        "type" fact is "file" or "dir"
+
+        Arguments
+            ftp -- connection to list directories with, if needed
+            path -- remote path to look up
+        """
+        path = PurePath(path)
+        if path == path.parent:
+            # The root of the connection always exists
+            return {"type": "dir"}
+        with self.lock:
+            if path in self.entries:
+                return self.entries[path]
+            if path.parent in self.listed:
+                return None
+        parent = self.stat(ftp, path.parent)
+        if parent is None or parent.get("type") != "dir":
+            return None
+        try:
+            self._list(ftp, path.parent)
+        except ftplib.error_perm as err:
+            LOGGER.debug(
+                "Couldn't list %s, considering %s doesn't exist: %s",
+                path.parent,
+                path,
+                utils.err_str(err),
+            )
+            return None
+        with self.lock:
+            return self.entries.get(path)
+
+    def index_tree(self, ftp: ftplib.FTP, directory: PurePath):
+        """
+        Indexes a whole remote tree at once, with one MLSD per directory
+        """
+        stack = [PurePath(directory)]
+        while stack:
+            current = stack.pop()
+            with self.lock:
+                if current in self.listed:
+                    content = {
+                        path: self.entries[path]
+                        for path in self.below.get(current, ())
+                        if path.parent == current and path in self.entries
+                    }
+                else:
+                    content = None
+            if content is None:
+                content = self._list(ftp, current)
+            stack.extend(
+                path for path, facts in content.items() if facts.get("type") == "dir"
+            )
+
+    def add_file(self, path: PurePath, size: int = None):
+        """
+        Records a file written to the remote
+        """
+        path = PurePath(path)
+        facts = {"type": "file"}
+        if size is not None:
+            facts["size"] = str(size)
+        with self.lock:
+            self.entries[path] = facts
+            self._track(path)
+
+    def add_dir(self, path: PurePath):
+        """
+        Records a directory created on the remote. It is known to be empty
+        """
+        path = PurePath(path)
+        with self.lock:
+            self.entries[path] = {"type": "dir"}
+            self.listed.add(path)
+            self._track(path)
+
+    def remove(self, path: PurePath):
+        """
+        Records the deletion of a remote file or directory
+        """
+        with self.lock:
+            self._forget(PurePath(path))
+
+    def move(self, src: PurePath, dest: PurePath):
+        """
+        Records a rename on the remote, of a file or of a directory with all that is
+        below it
+        """
+        src, dest = PurePath(src), PurePath(dest)
+        with self.lock:
+            known = (src, *self.below.get(src, ()))
+            entries = {
+                path: self.entries[path] for path in known if path in self.entries
+            }
+            listed = [path for path in known if path in self.listed]
+            self._forget(src)
+            self._forget(dest)
+            if src not in entries:
+                # Unknown source, the parent of dest must be listed again
+                self.listed.discard(dest.parent)
+            for path, facts in entries.items():
+                path = dest / path.relative_to(src)
+                self.entries[path] = facts
+                self._track(path)
+            for path in listed:
+                path = dest / path.relative_to(src)
+                self.listed.add(path)
+                self._track(path)
+
+    def _track(self, path: PurePath):
+        """
+        Records a path below its parents. Must be called with the lock held
+        """
+        for parent in path.parents:
+            self.below.setdefault(parent, set()).add(path)
+
+    def _forget(self, path: PurePath):
+        """
+        Forgets a path and all that is below it. Must be called with the lock held
+        """
+        for known in (path, *self.below.pop(path, ())):
+            self.entries.pop(known, None)
+            self.listed.discard(known)
+            self.below.pop(known, None)
+            for parent in known.parents:
+                below = self.below.get(parent)
+                if below is not None:
+                    below.discard(known)
+                    if not below:
+                        del self.below[parent]
+
+    def invalidate(self, path: PurePath = None):
+        """
+        Forgets what is known about a path and below it, or about everything. The
+        next lookups list the remote directories again
+        """
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                self.listed.clear()
+                self.below.clear()
+                return
+            path = PurePath(path)
+            self._forget(path)
+            self.listed.discard(path.parent)
+
+
+class StorStream:
+    """
+    Write-only binary file-like object uploading what is written to it, so that a
+    download is streamed to the server as it is received
+
+    Seeking back to the start aborts the transfer, the next write starts a new one
+    that replaces the remote file. This is what downloads do when they start over
+    """
+
+    def __init__(self, ftp: ftplib.FTP, path: PurePath):
+        """
+        Arguments
+            ftp -- connection to upload with
+            path -- remote path to upload to
+        """
+        self.ftp = ftp
+        self.path = path
+        self.conn = None
+        self.position = 0
+        self.hasher = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        if self.conn is None:
+            self.ftp.voidcmd("TYPE I")
+            self.conn = self.ftp.transfercmd("STOR %s" % self.path.as_posix())
+        self.conn.sendall(data)
+        self.position += len(data)
+        self.hasher.update(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence != io.SEEK_SET:
+            offset += self.position
+        if offset == self.position:
+            return offset
+        if offset != 0:
+            raise io.UnsupportedOperation("An upload can only restart from the start")
+        self.abort()
+        return 0
+
+    def truncate(self, size: int = None) -> int:
+        if size is not None and size != self.position:
+            raise io.UnsupportedOperation("An upload can't be truncated")
+        return self.position
+
+    def finish(self):
+        """
+        Completes the upload
+        """
+        if self.conn is None:
+            # Nothing was written, create an empty file
+            self.write(b"")
+        conn, self.conn = self.conn, None
+        try:
+            # Close the TLS layer cleanly, as ftplib does
+            unwrap = getattr(conn, "unwrap", None)
+            if unwrap is not None:
+                unwrap()
+        finally:
+            conn.close()
+        self.ftp.voidresp()
+
+    def abort(self):
+        """
+        Interrupts the upload. The remote file is left partial
+        """
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            conn.close()
+            try:
+                self.ftp.voidresp()
+            except ftplib.Error as err:
+                LOGGER.debug("Aborted upload of %s: %s", self.path, utils.err_str(err))
+        self.position = 0
+        self.hasher = hashlib.sha256()
+
+
+class HashRecords:
+    """
+    Hashes of the files uploaded to a FTP server, recorded in a sidecar file at the
+    root of the filesystem. They tell whether a remote file already has some content
+    on servers that can't hash their files. A record is trusted as long as the size
+    of the remote file matches it
+
+    Paths are posix paths relative to the root of the filesystem. The object is
+    safe to share between the connections of several threads
+    """
+
+    def __init__(self, path: PurePath):
+        """
+        Arguments
+            path -- remote path of the sidecar file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        # Path -> {"size": ..., "hashes": {algorithm: hex digest}}, None until loaded
+        self.records = None
+        # Directory -> paths of the records below it, at any depth
+        self.below = {}
+        # Number of changes not saved yet
+        self.dirty = 0
+
+    def load(self, ftp: ftplib.FTP):
+        """
+        Loads the records from the server, if not done yet
+        """
+        with self.lock:
+            if self.records is not None:
+                return
+        data = io.BytesIO()
+        try:
+            ftp.retrbinary("RETR %s" % self.path.as_posix(), data.write)
+            records = json.loads(data.getvalue().decode("utf-8"))
+        except ftplib.error_perm:
+            records = {}
+        except ValueError as err:
+            LOGGER.warning("Ignoring corrupted hash records: %s", utils.err_str(err))
+            records = {}
+        with self.lock:
+            if self.records is None:
+                self.records = {}
+                for path, record in records.items():
+                    self._add(path, record)
+
+    @staticmethod
+    def _parents(path: str):
+        return [
+            parent.as_posix()
+            for parent in PurePath(path).parents
+            if parent != PurePath(".")
+        ]
+
+    def _add(self, path: str, record: dict):
+        """
+        Sets the record of a path. Must be called with the lock held
+        """
+        if path not in self.records:
+            for parent in self._parents(path):
+                self.below.setdefault(parent, set()).add(path)
+        self.records[path] = record
+
+    def _pop(self, path: str) -> Optional[dict]:
+        """
+        Removes and returns the record of a path. Must be called with the lock held
+        """
+        record = self.records.pop(path, None)
+        if record is not None:
+            for parent in self._parents(path):
+                below = self.below.get(parent)
+                if below is not None:
+                    below.discard(path)
+                    if not below:
+                        del self.below[parent]
+        return record
+
+    def get(self, ftp: ftplib.FTP, path: str) -> Optional[dict]:
+        self.load(ftp)
+        with self.lock:
+            return self.records.get(path)
+
+    def put(self, ftp: ftplib.FTP, path: str, size: int, hashes: dict):
+        self.load(ftp)
+        with self.lock:
+            self._add(path, {"size": size, "hashes": hashes})
+            self.dirty += 1
+
+    def put_part(self, ftp: ftplib.FTP, path: str, source: dict):
+        """
+        Records the local file a partial upload is made of, so that a later run only
+        resumes it with the same file
+
+        Arguments
+            path -- path of the partial upload
+            source -- {"size": ..., "sha256": ...} of the local file
+        """
+        self.load(ftp)
+        with self.lock:
+            self._add(path, {"part-of": dict(source)})
+            self.dirty += 1
+
+    def get_part(self, ftp: ftplib.FTP, path: str) -> Optional[dict]:
+        """
+        Returns the local file a partial upload is made of, as given to put_part(),
+        or None if unknown
+        """
+        record = self.get(ftp, path)
+        return None if record is None else record.get("part-of")
+
+    def remove(self, path: str):
+        """
+        Forgets the records of a path and all that is below it
+        """
+        with self.lock:
+            if not self.records:
+                return
+            if path == ".":
+                self.dirty += len(self.records)
+                self.records.clear()
+                self.below.clear()
+                return
+            for known in (path, *self.below.get(path, ())):
+                if self._pop(known) is not None:
+                    self.dirty += 1
+
+    def move(self, src: str, dest: str):
+        with self.lock:
+            if not self.records:
+                return
+            self._pop(dest)
+            record = self._pop(src)
+            if record is not None:
+                self._add(dest, record)
+            self.dirty += 1
+
+    def save(self, ftp: ftplib.FTP) -> bool:
+        """
+        Saves the records to the server if they changed. This uploads the whole
+        sidecar, so it is only done once the filesystem is closed
+
+        Returns
+            True if the records were saved
+        """
+        with self.save_lock:
+            with self.lock:
+                if self.records is None or self.dirty == 0:
+                    return False
+                data = json.dumps(self.records, indent=1, sort_keys=True)
+                self.dirty = 0
+            ftp.storbinary(
+                "STOR %s" % self.path.as_posix(), io.BytesIO(data.encode("utf-8"))
+            )
+            return True
+
+
 class FTPFileSystem(common.FileSystem):
     """
     Represents a remote filesystem over FTP
+
+    Operations run on a pool of connections, so that the filesystem can be used
+    from several threads at once, each operation on its own connection
+
+    Uploads are skipped when the remote file already has the content. Sizes are
+    compared first, then hashes computed by the server (HASH or XSHA256 commands)
+    or else recorded on upload, see HashRecords
     """
 
     def __init__(
@@ -41,6 +685,8 @@ class FTPFileSystem(common.FileSystem):
         passwd: str,
         base_dir: common.PathLike = ".",
         use_tls: bool = False,
+        port: int = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
     ):
         """
         Creates a new filesystem object
@@ -51,27 +697,81 @@ class FTPFileSystem(common.FileSystem):
             passwd -- pawwsord to log with. Defaults to '' or '@anonymous' as per ftplib spec
             base_dir -- remote directory to use as the base for this filesystem
             use_tls -- use a secured connexion and secure the transmitted data
+            port -- port of the server. Defaults to the FTP port
+            pool_size -- maximum number of connections opened to the server
         """
         super().__init__(base_dir)
-        if use_tls:
-            self.ftp = ftplib.FTP_TLS(host)
-            self.ftp.login(user=user, passwd=passwd)
-            self.ftp.prot_p()
-        else:
-            self.ftp = ftplib.FTP(host)
-            self.ftp.login(user=user, passwd=passwd)
+        self.pool = FTPConnectionPool(
+            host=host,
+            user=user,
+            passwd=passwd,
+            use_tls=use_tls,
+            port=port,
+            size=pool_size,
+        )
+        self._local = threading.local()
         # test MLST command support
-        try:
-            list(self.ftp.mlsd())
-            self._mlsd_support = True
-        except ftplib.error_perm:
-            self._mlsd_support = False
-            LOGGER.warn(
-                "The FTP server does not support the MLSD command. Falling back to NLST, this may cause problems"
-            )
+        with self._connection():
+            try:
+                list(self.ftp.mlsd())
+                self._mlsd_support = True
+            except ftplib.error_perm:
+                self._mlsd_support = False
+                LOGGER.warn(
+                    "The FTP server does not support the MLSD command. Falling back to NLST, this may cause problems"
+                )
+        # Remote tree known from MLSD listings
+        self.index = RemoteIndex() if self._mlsd_support else None
+        # Remote directories known to exist, found or created by make_parent()
+        self.known_dirs = set()
+        self._dirs_lock = threading.Lock()
+        with self._connection():
+            features = self._features()
+        # hashlib name -> command to get the hash of a remote file
+        self.hash_commands = self._hash_features(features)
+        # Whether uploads can be resumed with REST then STOR, instead of APPE
+        self.rest_stream = "REST STREAM" in features
+        self.hash_records = HashRecords(self.base_dir / HASH_RECORD_FILE)
+        # Uploads skipped because the remote file already had the content
+        self.skipped = 0
+        self.saved_bytes = 0
+        self._skip_lock = threading.Lock()
         self.tempdir = tempfile.TemporaryDirectory(dir=".")
         self.tempdirpath = Path(self.tempdir.__enter__())
 
+    @property
+    def ftp(self) -> ftplib.FTP:
+        """
+        The connection held by the current thread, see _connection()
+        """
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            raise RuntimeError("No FTP connection is held by this thread")
+        return lease.ftp
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """
+        Context manager holding a connection of the pool for the current thread, or
+        reusing the one it already holds
+        """
+        lease = getattr(self._local, "lease", None)
+        if lease is not None:
+            yield lease.ftp
+            return
+        with self.pool.connection() as lease:
+            self._local.lease = lease
+            try:
+                yield lease.ftp
+            finally:
+                self._local.lease = None
+
+    def _reconnect(self) -> ftplib.FTP:
+        """
+        Replaces the connection held by the current thread, after it failed
+        """
+        return self._local.lease.renew()
+
     @classmethod
     def from_url(cls, url: str):
         """
@@ -83,31 +783,195 @@ class FTPFileSystem(common.FileSystem):
         purl = urllib.parse.urlparse(url)
         if purl.scheme not in ("ftp", "sftp"):
             raise common.InvalidURL(url=url, fstype="ftp")
+        query = urllib.parse.parse_qs(purl.query)
+        try:
+            pool_size = int(query.get("connections", [DEFAULT_POOL_SIZE])[-1])
+        except ValueError:
+            raise common.InvalidURL(url=url, fstype="ftp")
         return cls(
             host=purl.hostname,
             user=purl.username,
             passwd=purl.password,
             base_dir=purl.path.strip("/"),
             use_tls=purl.scheme == "sftp",
+            port=purl.port,
+            pool_size=pool_size,
         )
 
-    def __exit__(self, exc_type, exc_value, traceback):
+    def close(self):
+        """
+        Clean up resources. The hash records are saved to the server here, once for
+        the whole operation, whether it succeeded or not
+        """
+        try:
+            with self._connection():
+                self._save_hash_records()
+        except (*ftplib.all_errors, EOFError) as err:
+            LOGGER.warning("Couldn't save the hash records: %s", utils.err_str(err))
+        if self.skipped:
+            LOGGER.info(
+                "Skipped %s uploads of files already on the server, saved %s",
+                self.skipped,
+                utils.format_size(self.saved_bytes),
+            )
+        self.pool.close()
+        self.tempdir.cleanup()
+
+    def _features(self) -> list:
+        """
+        Returns the features the server lists in its FEAT answer, in upper case
+        """
+        try:
+            answer = self.ftp.sendcmd("FEAT")
+        except ftplib.Error:
+            return []
+        return [feature.strip().upper() for feature in answer.splitlines()[1:-1]]
+
+    @staticmethod
+    def _hash_features(features: list) -> dict:
+        """
+        Finds the hash commands supported by the server among its features
+        """
+        commands = {}
+        for feature in features:
+            name, _, args = feature.partition(" ")
+            if name == "HASH":
+                for algorithm in args.split(";"):
+                    algorithm = HASH_ALGORITHMS.get(algorithm.strip("* "))
+                    if algorithm is not None:
+                        commands.setdefault(algorithm, "HASH")
+            elif name in X_HASH_COMMANDS:
+                commands.setdefault(X_HASH_COMMANDS[name], name)
+        if commands:
+            LOGGER.debug("The FTP server can hash files with %s", ", ".join(commands))
+        return commands
+
+    def _remote_size(self, path: PurePath) -> Optional[int]:
+        """
+        Returns the size of a remote file, or None if it isn't a file or the size is
+        unknown
+        """
+        if self.index is not None:
+            facts = self.index.stat(self.ftp, path)
+            if facts is None or facts.get("type") != "file":
+                return None
+            if "size" in facts:
+                return int(facts["size"])
+        try:
+            # Servers may refuse SIZE in ASCII mode
+            self.ftp.voidcmd("TYPE I")
+            return self.ftp.size(path.as_posix())
+        except (ftplib.error_perm, ftplib.error_reply, ValueError):
+            return None
+
+    def _remote_hash(self, path: PurePath, algorithm: str) -> Optional[str]:
         """
-        Clean up resources
+        Returns the hex digest of a remote file computed by the server, or None
+        """
+        command = self.hash_commands.get(algorithm)
+        try:
+            if command == "HASH":
+                name = next(
+                    name
+                    for name, value in HASH_ALGORITHMS.items()
+                    if value == algorithm
+                )
+                self.ftp.sendcmd("OPTS HASH %s" % name)
+                # 213 <algorithm> <start>-<end> <digest> <path>
+                answer = self.ftp.sendcmd("HASH %s" % path.as_posix())
+                return answer.split()[3].lower()
+            elif command is not None:
+                # 213 <digest>
+                answer = self.ftp.sendcmd("%s %s" % (command, path.as_posix()))
+                return answer.split()[1].lower()
+        except (ftplib.error_perm, ftplib.error_reply, IndexError) as err:
+            LOGGER.debug("Couldn't hash remote file %s: %s", path, utils.err_str(err))
+        return None
+
+    def _record_key(self, path: PurePath) -> str:
+        return PurePath(path).relative_to(self.base_dir).as_posix()
+
+    def _has_content(
+        self,
+        path: PurePath,
+        size: Optional[int],
+        digest: Callable[[str], Optional[str]],
+    ) -> bool:
+        """
+        Tests if a remote file already has some content. Sizes are compared first,
+        then hashes computed by the server, or else the hashes recorded on upload
+
+        Arguments
+            path -- remote path of the file
+            size -- size of the content, if known
+            digest -- function returning the hex digest of the content for a hashlib
+                algorithm name, or None if it can't be computed
+        """
+        remote_size = self._remote_size(path)
+        if remote_size is None or (size is not None and size != remote_size):
+            return False
+        for algorithm in HASH_PREFERENCE:
+            if algorithm in self.hash_commands:
+                expected = digest(algorithm)
+                if expected is not None:
+                    remote = self._remote_hash(path, algorithm)
+                    if remote is not None:
+                        return remote == expected
+        record = self.hash_records.get(self.ftp, self._record_key(path))
+        if record is not None and record.get("size") == remote_size:
+            for algorithm in HASH_PREFERENCE:
+                if algorithm in record["hashes"]:
+                    expected = digest(algorithm)
+                    if expected is not None:
+                        return record["hashes"][algorithm] == expected
+        return False
+
+    def _save_hash_records(self):
+        if self.hash_records.save(self.ftp) and self.index is not None:
+            self.index.add_file(self.hash_records.path)
+
+    def _skip_upload(self, path: PurePath, size: int):
+        LOGGER.debug("%s already has the expected content, not uploading it", path)
+        with self._skip_lock:
+            self.skipped += 1
+            self.saved_bytes += size
+
+    def index_tree(self, path: common.PathLike = "."):
+        """
+        Indexes a whole remote tree at once, so that later checks of anything below
+        path are answered from memory. Does nothing without MLSD support
+
+        Arguments
+            path -- directory to index, relative to base_dir
+        """
+        if self.index is not None:
+            with self._connection():
+                self.index.index_tree(self.ftp, self.base_dir / path)
+
+    def invalidate(self, path: common.PathLike = None):
+        """
+        Forgets what is known of the remote tree, for when it was modified by other
+        means than this filesystem
+
+        Arguments
+            path -- path relative to base_dir to forget, with all that is below it.
+                Defaults to everything
         """
-        self.ftp.quit()
-        self.tempdir.__exit__(exc_type, exc_value, traceback)
+        if path is None:
+            with self._dirs_lock:
+                self.known_dirs.clear()
+            if self.index is not None:
+                self.index.invalidate()
+            self.hash_records.remove(".")
+        else:
+            self._forget(self.base_dir / path)
+            if self.index is not None:
+                self.index.invalidate(self.base_dir / path)
 
     def _exists(self, path: common.PathLike):
         path = PurePath(path)
-        if self._mlsd_support:
-            try:
-                self.ftp.sendcmd("MLST %s" % path.as_posix())
-                return True
-            except ftplib.error_perm as err:
-                if "cannot be listed" in err.args[0]:
-                    return False
-                raise
+        if self.index is not None:
+            return self.index.stat(self.ftp, path) is not None
         else:
             if str(path) == ".":
                 LOGGER.debug("No MLSD support mode: '.' always exists")
@@ -133,6 +997,7 @@ class FTPFileSystem(common.FileSystem):
                 )
                 return False
 
+    @_pooled
     def exists(self, path: common.PathLike):
         """
         Determines if the path points to something
@@ -145,6 +1010,7 @@ class FTPFileSystem(common.FileSystem):
         """
         return self._exists(self.base_dir / path)
 
+    @_pooled
     def is_file(self, path: common.PathLike):
         """
         Tests if a path is a file. Returns false if the path doesn't exists
@@ -155,15 +1021,9 @@ class FTPFileSystem(common.FileSystem):
         Returns
             True if the relative path exists and is a file, false otherwise
         """
-        if self._mlsd_support:
-            try:
-                return "type=file" in self.ftp.sendcmd(
-                    "MLST %s" % (self.base_dir / path).as_posix()
-                )
-            except ftplib.error_perm as err:
-                if "cannot be listed" in err.args[0]:
-                    return False
-                raise
+        if self.index is not None:
+            facts = self.index.stat(self.ftp, self.base_dir / path)
+            return facts is not None and facts["type"] == "file"
         else:
             if not self.exists(path):
                 return False
@@ -195,13 +1055,9 @@ class FTPFileSystem(common.FileSystem):
             True if the relative path exists and is a directory, false otherwise
         """
         path = PurePath(path)
-        if self._mlsd_support:
-            try:
-                return "type=dir" in self.ftp.sendcmd("MLST %s" % path.as_posix())
-            except ftplib.error_perm as err:
-                if "cannot be listed" in err.args[0]:
-                    return False
-                raise
+        if self.index is not None:
+            facts = self.index.stat(self.ftp, path)
+            return facts is not None and facts["type"] == "dir"
         else:
             LOGGER.debug(
                 "No MLSD support mode: trying to find if '%s' is a directory", path
@@ -224,9 +1080,11 @@ class FTPFileSystem(common.FileSystem):
             LOGGER.debug("Could use CWD on '%s', it is a directory", path)
             return True
 
+    @_pooled
     def is_dir(self, path: common.PathLike):
         return self._is_dir(self.base_dir / path)
 
+    @_pooled
     def unlink(self, path: common.PathLike):
         """
         Deletes a file
@@ -240,10 +1098,11 @@ class FTPFileSystem(common.FileSystem):
             try:
                 self.ftp.delete((self.base_dir / path).as_posix())
             except ftplib.error_perm as err:
-                if "No such file or directory" in err.args[0]:
-                    return
-                raise FTPPermissionError(err=err, err_str=utils.err_str(err))
+                if "No such file or directory" not in err.args[0]:
+                    raise FTPPermissionError(err=err, err_str=utils.err_str(err))
+            self._forget(self.base_dir / path)
 
+    @_pooled
     def rmdir(self, path: common.PathLike):
         """
         Recursively deletes a folder
@@ -257,10 +1116,11 @@ class FTPFileSystem(common.FileSystem):
             try:
                 self.ftp.rmd((self.base_dir / path).as_posix())
             except ftplib.error_perm as err:
-                if "No such file or directory" in err.args[0]:
-                    return
-                raise FTPPermissionError(err=err, err_str=utils.err_str(err))
+                if "No such file or directory" not in err.args[0]:
+                    raise FTPPermissionError(err=err, err_str=utils.err_str(err))
+            self._forget(self.base_dir / path)
 
+    @_pooled
     def move_file(
         self, src: common.PathLike, dest: common.PathLike, force: bool = False
     ):
@@ -281,49 +1141,327 @@ class FTPFileSystem(common.FileSystem):
                 FileExistsError("%s exists, cannot move to that destination" % dest)
         if self.exists(src):
             self.ftp.rename(posix_path, posix_dest)
+            if self.index is not None:
+                self.index.move(self.base_dir / src, self.base_dir / dest)
+            self.hash_records.move(
+                self._record_key(self.base_dir / src),
+                self._record_key(self.base_dir / dest),
+            )
         else:
             raise FileNotFoundError("%s doesn't exist, cannot move it" % src)
 
+    def _forget(self, path: PurePath):
+        if self.index is not None:
+            self.index.remove(path)
+        self.hash_records.remove(self._record_key(path))
+        with self._dirs_lock:
+            self.known_dirs = {
+                known
+                for known in self.known_dirs
+                if known != path and path not in known.parents
+            }
+
+    def _stor(self, path: PurePath, fp, hashes: dict = None, offset: int = 0):
+        """
+        Uploads a file-like object to a remote path, recording it in the index and
+        its hashes in the hash records
+
+        Arguments
+            path -- remote path to upload to
+            fp -- file-like object to read the data from
+            hashes -- known hashes of the data, {algorithm: hex digest}. The sha256
+                is computed during the upload, unless it is resumed
+            offset -- number of bytes of the data already in the remote file. fp is
+                positioned after them, and the upload resumes there with REST then
+                STOR, or with APPE
+        """
+        hasher = hashlib.sha256()
+        size = offset
+
+        def update(data):
+            nonlocal size
+            size += len(data)
+            hasher.update(data)
+
+        try:
+            if offset and self.rest_stream:
+                self.ftp.storbinary(
+                    cmd="STOR %s" % path.as_posix(),
+                    fp=fp,
+                    callback=update,
+                    rest=offset,
+                )
+            elif offset:
+                self.ftp.storbinary(
+                    cmd="APPE %s" % path.as_posix(), fp=fp, callback=update
+                )
+            else:
+                self.ftp.storbinary(
+                    cmd="STOR %s" % path.as_posix(), fp=fp, callback=update
+                )
+        except BaseException:
+            # A partial file may have been left behind
+            if self.index is not None:
+                self.index.invalidate(path)
+            self.hash_records.remove(self._record_key(path))
+            raise
+        if self.index is not None:
+            self.index.add_file(path, size)
+        hashes = dict(hashes or {})
+        if not offset:
+            hashes["sha256"] = hasher.hexdigest()
+        if hashes:
+            self.hash_records.put(self.ftp, self._record_key(path), size, hashes)
+
+    def _replace(self, src: PurePath, dest: PurePath):
+        """
+        Renames a remote file over another one
+        """
+        try:
+            self.ftp.rename(src.as_posix(), dest.as_posix())
+        except ftplib.error_perm:
+            # Some servers don't replace an existing file
+            if not self._exists(dest):
+                raise
+            self.ftp.delete(dest.as_posix())
+            self.ftp.rename(src.as_posix(), dest.as_posix())
+        if self.index is not None:
+            self.index.move(src, dest)
+        self.hash_records.move(self._record_key(src), self._record_key(dest))
+
+    def _send_local(self, src: common.PathLike, path: PurePath, hashes: dict = None):
+        """
+        Uploads a local file to a remote path, retrying the upload if it is
+        interrupted
+
+        Files of RESUMABLE_SIZE or more are uploaded to <path>.part, and retries
+        resume where the transfer stopped. The part replaces path once its size is
+        checked, and its hash if the upload was resumed and the server can compute
+        it. A partial upload left by a previous run is resumed the same way, if the
+        hash records show it was made of the same file. Otherwise it is uploaded
+        again from the start. The hashes of a resumed upload are only recorded if
+        the server confirmed them. Smaller files are simply uploaded again, to
+        <path>.part too if path exists, so that a failed upload never truncates it.
+        The size of the uploaded file is always checked
+
+        Arguments
+            src -- local file to upload
+            path -- remote path to upload to
+            hashes -- known hashes of src, {algorithm: hex digest}
+
+        Raises
+            FTPUploadError -- if the uploaded file is wrong
+        """
+        size = Path(src).stat().st_size
+        resumable = size >= RESUMABLE_SIZE
+        if resumable or self._exists(path):
+            part = path.with_name(path.name + ".part")
+        else:
+            part = path
+        hashes = dict(hashes or {})
+        source = None
+        if resumable:
+            if "sha256" not in hashes:
+                hashes["sha256"] = utils.file_hash(src)
+            source = {"size": size, "sha256": hashes["sha256"]}
+        resumed = False
+        attempt = 0
+        with open(src, mode="rb") as f:
+            while True:
+                attempt += 1
+                offset = (self._remote_size(part) or 0) if resumable else 0
+                if offset and (
+                    offset > size
+                    or attempt == 1
+                    and self.hash_records.get_part(self.ftp, self._record_key(part))
+                    != source
+                ):
+                    # Left by a previous run, but not of this file
+                    LOGGER.debug("Discarding stale partial upload %s", part)
+                    self.ftp.delete(part.as_posix())
+                    self._forget(part)
+                    offset = 0
+                if resumable and not offset:
+                    self.hash_records.put_part(self.ftp, self._record_key(part), source)
+                if offset:
+                    LOGGER.info(
+                        "Resuming upload of %s after %s",
+                        path,
+                        utils.format_size(offset),
+                    )
+                    resumed = True
+                f.seek(offset)
+                try:
+                    self._stor(part, f, hashes=hashes, offset=offset)
+                    break
+                except ftplib.error_perm as err:
+                    if not offset or attempt >= UPLOAD_ATTEMPTS:
+                        raise
+                    # The server can't resume, start over
+                    LOGGER.debug("Couldn't resume %s: %s", path, utils.err_str(err))
+                    self.ftp.delete(part.as_posix())
+                except (OSError, EOFError, ftplib.error_temp) as err:
+                    if resumable:
+                        # The part is still made of src, for the next attempt or run
+                        self.hash_records.put_part(
+                            self.ftp, self._record_key(part), source
+                        )
+                    if attempt >= UPLOAD_ATTEMPTS:
+                        raise
+                    LOGGER.warning(
+                        "Upload of %s was interrupted, resuming it: %s",
+                        path,
+                        utils.err_str(err),
+                    )
+                    self._reconnect()
+        remote_size = self.ftp.size(part.as_posix())
+        error = None
+        confirmed = not resumed
+        if remote_size != size:
+            error = "%s bytes" % size, "%s bytes" % remote_size
+        elif resumed and "sha256" in self.hash_commands:
+            remote_hash = self._remote_hash(part, "sha256")
+            if remote_hash is not None and remote_hash != hashes["sha256"]:
+                error = "sha256:" + hashes["sha256"], "sha256:" + remote_hash
+            confirmed = remote_hash is not None
+        if error is not None:
+            self.ftp.delete(part.as_posix())
+            self._forget(part)
+            raise FTPUploadError(path, *error)
+        if not confirmed:
+            # Only the size of the resumed upload is known to be right, don't vouch
+            # for its content
+            self.hash_records.remove(self._record_key(part))
+        if part != path:
+            self._replace(part, path)
+
+    @_pooled
     def make_parent(self, path: common.PathLike):
         """
         Creates all the missing parents of a path
         """
-        fullpath = self.base_dir / path
-        LOGGER.debug("Creating parents for %s", fullpath)
-        i = -1
-        for i, parent in enumerate(fullpath.parents):
-            if self._is_dir(parent):
-                break
-        if i > -1:
-            LOGGER.debug("To create: %s", list(fullpath.parents)[:i])
-            for parent in reversed(list(fullpath.parents)[:i]):
-                LOGGER.debug("Creating %s", parent)
-                self.ftp.mkd(parent.as_posix())
+        self._make_dirs([(self.base_dir / path).parent])
+
+    @_pooled
+    def make_dirs(self, paths):
+        """
+        Creates directories and their missing parents at once, e.g. before a batch
+        of uploads
 
-    def download(self, url: str, dest: common.PathLike, force: bool = False):
+        Arguments
+            paths -- iterable of directories relative to base_dir
+        """
+        self._make_dirs([self.base_dir / path for path in paths])
+
+    def _make_dirs(self, directories):
+        """
+        Creates remote directories and their missing parents, shallowest first.
+        Directories known to exist are not checked again, and the content of a
+        directory that was just created is known not to exist
+        """
+        todo = set()
+        for directory in directories:
+            for current in (PurePath(directory), *PurePath(directory).parents):
+                if current == current.parent:
+                    break
+                with self._dirs_lock:
+                    if current in self.known_dirs:
+                        break
+                todo.add(current)
+        created = set()
+        for directory in sorted(todo, key=lambda path: (len(path.parts), path)):
+            if directory.parent not in created and self._is_dir(directory):
+                with self._dirs_lock:
+                    self.known_dirs.add(directory)
+                continue
+            LOGGER.debug("Creating %s", directory)
+            try:
+                self.ftp.mkd(directory.as_posix())
+            except ftplib.error_perm:
+                # Another connection may have created it in the meantime
+                if self.index is not None:
+                    self.index.invalidate(directory)
+                if not self._is_dir(directory):
+                    raise
+            else:
+                created.add(directory)
+                if self.index is not None:
+                    self.index.add_dir(directory)
+            with self._dirs_lock:
+                self.known_dirs.add(directory)
+
+    def download(
+        self,
+        url: str,
+        dest: common.PathLike,
+        force: bool = False,
+        checksum: str = None,
+        size: int = None,
+    ):
         """
-        Downloads a file from the web into the filesystem
+        Downloads a file from the web into the filesystem. The download is
+        streamed to the server as it is received, without a local copy. dest is
+        left untouched if the download fails or doesn't match checksum and size.
+        Nothing is transferred if dest already matches checksum and size
 
         Arguments
             url -- url of the file to download
             dest -- destination file
             force -- overwrite destination file if it exists
+            checksum -- expected "<algorithm>:<hex digest>" of the file, if known
+            size -- expected size of the file in bytes, if known
         """
-        if self.exists(dest):
-            if force:
-                self.unlink(dest)
-            else:
-                raise FileExistsError(
-                    "%s exists, cannot doawnload in that destination" % dest
-                )
-        self.make_parent(dest)
-        with tempfile.TemporaryFile(dir=self.tempdirpath) as tmp:
-            tmp.write(requests.get(url).content)
-            tmp.seek(0)
-            self.ftp.storbinary(
-                cmd="STOR %s" % (self.base_dir / dest).as_posix(), fp=tmp
+        if checksum is not None:
+            algorithm, _, expected = checksum.lower().partition(":")
+            with self._connection():
+                if self._has_content(
+                    self.base_dir / dest,
+                    size,
+                    lambda name: expected if name == algorithm else None,
+                ):
+                    self._skip_upload(
+                        self.base_dir / dest, self._remote_size(self.base_dir / dest)
+                    )
+                    return
+        if not force and self.exists(dest):
+            raise FileExistsError(
+                "%s exists, cannot doawnload in that destination" % dest
             )
+        fullpath = self.base_dir / dest
+        part = fullpath.with_name(fullpath.name + ".part")
+        with self._connection():
+            self.make_parent(dest)
+            # The download is streamed to a temporary file on the server, which only
+            # replaces dest once complete and verified
+            stream = StorStream(self.ftp, part)
+            try:
+                size = network.download_to(url, stream, checksum=checksum, size=size)
+                stream.finish()
+                self.ftp.voidcmd("TYPE I")
+                remote_size = self.ftp.size(part.as_posix())
+                if remote_size != size:
+                    raise network.ChecksumMismatchError(
+                        url, "%s bytes" % size, "%s bytes on the server" % remote_size
+                    )
+            except BaseException:
+                try:
+                    stream.abort()
+                    self.ftp.delete(part.as_posix())
+                except (*ftplib.all_errors, EOFError):
+                    # The connection itself may have failed
+                    pass
+                if self.index is not None:
+                    self.index.invalidate(part)
+                raise
+            self._replace(part, fullpath)
+            if self.index is not None:
+                self.index.add_file(fullpath, size)
+            hashes = {"sha256": stream.hasher.hexdigest()}
+            if checksum is not None:
+                hashes[algorithm] = expected
+            self.hash_records.put(self.ftp, self._record_key(fullpath), size, hashes)
 
+    @_pooled
     def send_data(self, fp, dest: common.PathLike, force: bool = False):
         """
         Sends the content of a filelike object to dest
@@ -339,33 +1477,48 @@ class FTPFileSystem(common.FileSystem):
             else:
                 raise FileExistsError("%s exists, cannot send data into it" % dest)
         self.make_parent(dest)
-        self.ftp.storbinary(cmd="STOR %s" % (self.base_dir / dest).as_posix(), fp=fp)
+        self._stor(self.base_dir / dest, fp)
 
+    @_pooled
     def send_file(
         self, src: common.PathLike, dest: common.PathLike, force: bool = False
     ):
         """
-        Sends a local file to the filesystem
+        Sends a local file to the filesystem. Nothing is uploaded if dest already
+        has the content of src. Interrupted uploads are resumed, see _send_local()
 
         Arguments
             src -- local path to send
             dest -- destination file
             force -- overwrite dest if it exists
         """
-        if self.exists(dest):
-            if force:
-                self.unlink(dest)
-            else:
-                raise FileExistsError("%s exists, cannot send file into it" % dest)
+        size = Path(src).stat().st_size
+        digests = {}
+
+        def digest(algorithm):
+            if algorithm not in digests:
+                hsh = hashlib.new(algorithm)
+                with open(src, mode="rb") as f:
+                    for chunk in iter(lambda: f.read(128 * 1024), b""):
+                        hsh.update(chunk)
+                digests[algorithm] = hsh.hexdigest()
+            return digests[algorithm]
+
+        if self._has_content(self.base_dir / dest, size, digest):
+            self._skip_upload(self.base_dir / dest, size)
+            return
+        if not force and self.exists(dest):
+            raise FileExistsError("%s exists, cannot send file into it" % dest)
         self.make_parent(dest)
-        with open(src, mode="rb") as f:
-            self.ftp.storbinary(cmd="STOR %s" % (self.base_dir / dest).as_posix(), fp=f)
+        # The upload replaces dest once complete
+        self._send_local(src, self.base_dir / dest, hashes=digests)
 
     def send_dir(
         self, src: common.PathLike, dest: common.PathLike, force: bool = False
     ):
         """
-        Sends a local directory to the filesystem
+        Sends a local directory to the filesystem. Directories are created first,
+        then the files are uploaded on all the connections of the pool
 
         Arguments
             src -- local path to send
@@ -380,6 +1533,7 @@ class FTPFileSystem(common.FileSystem):
                 self.rmdir(dest)
             else:
                 raise FileExistsError("%s exists, cannot send dir into it" % dest)
+        files = []
         stack = [src]
         while stack:
             elem = stack.pop()
@@ -387,10 +1541,21 @@ class FTPFileSystem(common.FileSystem):
                 for subelem in elem.iterdir():
                     stack.append(subelem)
             elif elem.is_file():
-                dst = self.base_dir / dest / elem.relative_to(src)
-                with open(elem, mode="rb") as f:
-                    self.ftp.storbinary(cmd="STOR %s" % dst.as_posix(), fp=f)
+                files.append(elem)
+        self.make_dirs(
+            {PurePath(dest)}
+            | {PurePath(dest) / elem.parent.relative_to(src) for elem in files}
+        )
+
+        def send(elem):
+            with self._connection():
+                self._send_local(elem, self.base_dir / dest / elem.relative_to(src))
+
+        # Workers wait for a connection held by this thread otherwise
+        jobs = 1 if getattr(self._local, "lease", None) is not None else self.pool.size
+        utils.thread_map(send, files, jobs)
 
+    @_pooled
     def open(self, path: common.PathLike, mode: utils.OpenMode = "rt", encoding=None):
         """
         Open a file on the filesystem
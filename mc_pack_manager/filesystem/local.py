@@ -5,10 +5,10 @@ Part of the Minecraft Pack Manager utility (mpm)
 """
 # Standard library import
 from pathlib import Path
-import requests
 import shutil
 
 # Local imports
+from .. import network
 from .. import utils
 from ..filesystem import common
 
@@ -111,23 +111,41 @@ class LocalFileSystem(common.FileSystem):
         dest = self.base_dir / Path(dest)
         path.rename(dest)
 
-    def download(self, url: str, dest: common.PathLike, force: bool = False):
+    def download(
+        self,
+        url: str,
+        dest: common.PathLike,
+        force: bool = False,
+        checksum: str = None,
+        size: int = None,
+    ):
         """
-        Downloads a file from the web into the filesystem
+        Downloads a file from the web into the filesystem. dest is left untouched
+        if the download fails or doesn't match checksum and size
 
         Arguments
             url -- url of the file to download
             dest -- destination file
             force -- overwrite destination file if it exists
+            checksum -- expected "<algorithm>:<hex digest>" of the file, if known
+            size -- expected size of the file in bytes, if known
         """
         dest = self.base_dir / dest
         if not force and dest.exists():
             raise FileExistsError(
                 "%s exists, cannot download in that destination" % dest
             )
-        dest.parent.mkdir(exist_ok=True, parents=True)
-        with dest.open("wb") as f:
-            f.write(requests.get(url).content)
+        network.download_file(url, dest, checksum=checksum, size=size)
+
+    def make_dirs(self, paths):
+        """
+        Creates directories and their missing parents
+
+        Arguments
+            paths -- iterable of directories relative to base_dir
+        """
+        for path in paths:
+            (self.base_dir / path).mkdir(parents=True, exist_ok=True)
 
     def send_data(self, fp, dest: common.PathLike, force: bool = False):
         """
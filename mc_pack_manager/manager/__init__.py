@@ -4,6 +4,8 @@ Main implementation package
 Part of the Minecraft Pack Manager utility (mpm)
 """
 
+from ..manager import cache
+from ..manager import prefetch
 from ..manager import snapshot
 from ..manager import release
 from ..manager import update
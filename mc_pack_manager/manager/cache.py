@@ -0,0 +1,137 @@
+"""
+Cache management module
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import functools
+import http.server
+import logging
+import time
+
+# Local import
+from .. import network
+from .. import utils
+
+LOGGER = logging.getLogger("mpm.manager.cache")
+
+
+class CacheDisabledError(Exception):
+    """
+    The caches are disabled, there is nothing to manage
+    """
+
+
+def _get_caches():
+    jar_cache = network.get_jar_cache()
+    if jar_cache is None or network.TwitchAPI.STORE is None:
+        raise CacheDisabledError("The caches are disabled, remove --no-cache")
+    return jar_cache, network.TwitchAPI.STORE
+
+
+def info():
+    """
+    Logs the content of the caches
+    """
+    jar_cache, store = _get_caches()
+    addons, files, urls = store.count()
+    LOGGER.info("Metadata cache %s", store.path)
+    LOGGER.info("  - %s addons, %s files, %s download urls", addons, files, urls)
+    entries = jar_cache.entries()
+    LOGGER.info("Jar store %s", jar_cache.root)
+    LOGGER.info(
+        "  - %s jars, %s used out of %s",
+        len(entries),
+        utils.format_size(sum(size for _, size, _ in entries)),
+        utils.format_size(jar_cache.max_size),
+    )
+    if entries:
+        oldest = min(last_use for _, _, last_use in entries)
+        LOGGER.info(
+            "  - least recently used jar was last used on %s",
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(oldest)),
+        )
+    LOGGER.debug(
+        "Stored jars:\n  - %s",
+        "\n  - ".join(
+            "%s (%s)"
+            % (path.relative_to(jar_cache.root).as_posix(), utils.format_size(size))
+            for path, size, _ in sorted(entries)
+        ),
+    )
+
+
+def prune(max_size: str = None):
+    """
+    Evicts the least recently used jars from the jar store
+
+    Arguments
+        max_size -- size to shrink the store to, such as "2G". Defaults to the store
+            maximum size
+    """
+    jar_cache, _ = _get_caches()
+    count, freed = jar_cache.prune(
+        None if max_size is None else utils.parse_size(max_size)
+    )
+    LOGGER.info("Removed %s jars, freed %s", count, utils.format_size(freed))
+
+
+def clear(jars: bool = True, metadata: bool = True):
+    """
+    Empties the caches
+
+    Arguments
+        jars -- empty the jar store
+        metadata -- empty the metadata cache
+    """
+    jar_cache, store = _get_caches()
+    if jars:
+        count, freed = jar_cache.clear()
+        LOGGER.info("Removed %s jars, freed %s", count, utils.format_size(freed))
+    if metadata:
+        store.clear()
+        LOGGER.info("Emptied the metadata cache")
+
+
+class _JarStoreHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves the jars of the store, hiding partial downloads
+    """
+
+    def send_head(self):
+        if self.path.split("?", 1)[0].endswith((".part", ".part.json")):
+            self.send_error(404, "File not found")
+            return None
+        return super().send_head()
+
+    def list_directory(self, path):
+        self.send_error(404, "File not found")
+        return None
+
+    def log_message(self, format, *args):
+        LOGGER.debug("%s - %s", self.address_string(), format % args)
+
+
+def serve(host: str = "", port: int = 8000):
+    """
+    Serves the jar store over HTTP, as a download mirror for other MPM instances on
+    the network. They use it with:
+
+        --mirror http://<this host>:<port>/{addonID}/{fileID}/{filename}
+
+    Arguments
+        host -- address to listen on. Defaults to all interfaces
+        port -- port to listen on
+    """
+    jar_cache, _ = _get_caches()
+    handler = functools.partial(_JarStoreHandler, directory=str(jar_cache.root))
+    with http.server.ThreadingHTTPServer((host, port), handler) as server:
+        LOGGER.info(
+            "Serving the jar store %s on port %s, press Ctrl+C to stop",
+            jar_cache.root,
+            server.server_address[1],
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            LOGGER.info("Stopped serving the jar store")
@@ -62,7 +62,7 @@ def format_modlist(
     return SEP + ("\n" + SEP).join(fmods)
 
 
-def build_new_modlist(pack_manifest, curse_manifest):
+def build_new_modlist(pack_manifest, curse_manifest, jobs: int = 1):
     """
     From an old pack_manifest and the curse_manifest file of the update
         compute the new modlist in pack_manifest format
@@ -70,6 +70,7 @@ def build_new_modlist(pack_manifest, curse_manifest):
     Arguments
         pack_manifest -- the pack manifest of the current version
         curse_manifest -- the curse manifest of the next version
+        jobs -- number of concurrent network lookups used to resolve mods
     
     Returns
         the "mods" property of the pack manifest for the new version. Mods
@@ -77,48 +78,74 @@ def build_new_modlist(pack_manifest, curse_manifest):
     """
     LOGGER.info("Building new modlist")
     mod_map = {mod["addonID"]: mod for mod in pack_manifest["mods"]}
+    # Find what needs resolving
+    unnamed = []
+    unresolved = []
+    for file_data in curse_manifest["files"]:
+        addonID, fileID = file_data["projectID"], file_data["fileID"]
+        old_mod = mod_map.get(addonID, {})
+        if "name" not in old_mod and addonID not in unnamed:
+            unnamed.append(addonID)
+        if old_mod.get("fileID") != fileID or "filename" not in old_mod:
+            unresolved.append((addonID, fileID))
     LOGGER.info(
         "%s mods needs resolving, this might take a while",
-        sum(
-            1
-            for fd in curse_manifest["files"]
-            if (
-                fd["projectID"] not in mod_map
-                or "name" not in mod_map[fd["projectID"]]
-                or mod_map[fd["projectID"]]["fileID"] != fd["fileID"]
-                or (
-                    mod_map[fd["projectID"]]["fileID"] == fd["fileID"]
-                    and "filename" not in mod_map[fd["projectID"]]
-                )
-            )
-        ),
+        len(set(unnamed) | {addonID for addonID, _ in unresolved}),
     )
+    if jobs > 1:
+        LOGGER.info("Using %s concurrent jobs", jobs)
+    addons_info = network.TwitchAPI.get_addons_info(unnamed, jobs=jobs)
+    files_info = network.TwitchAPI.get_files_info(unresolved, jobs=jobs)
+    names = {addonID: info["name"] for addonID, info in addons_info.items()}
+    filenames = {key: info["fileName"] for key, info in files_info.items()}
+    # Build the list, in the curse manifest order
     new_mods = []
     for file_data in curse_manifest["files"]:
         addonID = file_data["projectID"]
         mod = {"addonID": addonID, "fileID": file_data["fileID"]}
         if addonID in mod_map and "packmode" in mod_map[addonID]:
             mod["packmode"] = mod_map[addonID]["packmode"]
-        if addonID in mod_map and "name" in mod_map[addonID]:
-            mod["name"] = mod_map[addonID]["name"]
-        else:
-            mod["name"] = network.TwitchAPI.get_addon_info(addonID)["name"]
+        if addonID in names:
+            mod["name"] = names[addonID]
             LOGGER.info("Resolved '%s'", mod["name"])
-        if (
-            addonID in mod_map
-            and mod_map[addonID]["fileID"] == mod["fileID"]
-            and "filename" in mod_map[addonID]
-        ):
-            mod["filename"] = mod_map[addonID]["filename"]
         else:
-            mod["filename"] = network.TwitchAPI.get_file_info(addonID, mod["fileID"])[
-                "fileName"
-            ]
+            mod["name"] = mod_map[addonID]["name"]
+        if (addonID, mod["fileID"]) in filenames:
+            mod["filename"] = filenames[(addonID, mod["fileID"])]
             LOGGER.info("Resolved '%s' to '%s'", mod["name"], mod["filename"])
+        else:
+            mod["filename"] = mod_map[addonID]["filename"]
         new_mods.append(mod)
     return new_mods
 
 
+def install_mod(fs, mod: Mapping[str, str]):
+    """
+    Installs a mod jar in the 'mods' folder of a filesystem, using the local
+    jar store when it is enabled. The jar is checked against the hash and size
+    given by the TwitchAPI
+
+    Arguments
+        fs -- filesystem.common.FileSystem to install the mod on
+        mod -- the mod to install, as in the "mods" property of a pack manifest
+    """
+    addonID, fileID = mod["addonID"], mod["fileID"]
+    dest = "mods/" + mod["filename"]
+    jar_cache = network.get_jar_cache()
+    if jar_cache is None:
+        checksum, size = network.TwitchAPI.get_file_checksum(addonID, fileID)
+        fs.download(
+            network.TwitchAPI.get_download_url(addonID, fileID),
+            dest,
+            force=True,
+            checksum=checksum,
+            size=size,
+        )
+    else:
+        with jar_cache.using(addonID, fileID, mod["filename"]) as jar:
+            fs.send_file(jar, dest, force=True)
+
+
 def compute_mod_diff(
     old_mods: List[Mapping[str, str]],
     new_mods: List[Mapping[str, str]],
@@ -0,0 +1,119 @@
+"""
+Cache warming module
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import logging
+from pathlib import Path
+from typing import Union
+import zipfile
+
+# Local import
+from .. import manifest
+from .. import network
+from .. import utils
+from ..manager import common
+from ..manager.cache import CacheDisabledError
+
+LOGGER = logging.getLogger("mpm.manager.prefetch")
+
+PathLike = Union[str, Path]
+
+
+class PrefetchFailedError(utils.AutoFormatError, Exception):
+    """
+    Some mods could not be downloaded into the jar store
+
+    Attributes
+        names -- names of the mods that failed to download
+        failures -- list of the exceptions that made each download fail
+        message -- error explanation (auto-formatted, see AutoFormatError base class)
+    """
+
+    def __init__(
+        self, names, failures, message="Failed to prefetch: {names}",
+    ):
+        super().__init__(message)
+        self.names = names
+        self.failures = failures
+        self.message = message
+
+
+def prefetch(snapshot: PathLike, packmodes=None, jobs: int = 8):
+    """
+    Fills the local caches with everything needed to install a snapshot, so that
+    later 'update' and 'release serverfiles' runs only read from the local disk.
+    No installation is modified
+
+    Arguments
+        snapshot -- snapshot file generated by 'mpm snapshot'
+        packmodes -- packmodes whose mods should be fetched. Defaults to all mods
+        jobs -- number of concurrent network requests and downloads
+
+    Raises
+        CacheDisabledError -- if the caches are disabled
+        PrefetchFailedError -- if some mods couldn't be downloaded
+    """
+    jar_cache = network.get_jar_cache()
+    if jar_cache is None or network.TwitchAPI.STORE is None:
+        raise CacheDisabledError("The caches are disabled, remove --no-cache")
+    LOGGER.info("Reading pack-manifest.json from %s", snapshot)
+    with zipfile.ZipFile(snapshot) as zf, zf.open("pack-manifest.json") as f:
+        pack_manifest = manifest.pack.load(f)
+    if packmodes:
+        manifest.pack.check_packmodes(pack_manifest["packmodes"], packmodes)
+        selected_mods = manifest.pack.get_selected_mods(pack_manifest, packmodes)
+    else:
+        LOGGER.info("No 'packmodes' argument, using all packmodes")
+        selected_mods = pack_manifest["mods"]
+    LOGGER.debug(
+        "Selected mods:\n%s", common.format_modlist(selected_mods, print_version=True),
+    )
+    LOGGER.info("Resolving %s mods", len(selected_mods))
+    files = [(mod["addonID"], mod["fileID"]) for mod in selected_mods]
+    file_infos = network.TwitchAPI.get_files_info(files, jobs)
+    urls = network.TwitchAPI.get_download_urls(files, jobs)
+    total = sum(info.get("fileLength") or 0 for info in file_infos.values())
+    if total > jar_cache.max_size:
+        LOGGER.warning(
+            "The selected mods (%s) don't fit in the jar store (%s), see --jar-cache-size",
+            utils.format_size(total),
+            utils.format_size(jar_cache.max_size),
+        )
+    jars = []
+    for mod in selected_mods:
+        addonID, fileID = mod["addonID"], mod["fileID"]
+        jarname = mod.get("filename") or file_infos[(addonID, fileID)]["fileName"]
+        jars.append((addonID, fileID, jarname))
+
+    def fetch(jar):
+        addonID, fileID, jarname = jar
+        try:
+            jar_cache.fetch(addonID, fileID, jarname, url=urls[(addonID, fileID)])
+        except Exception as err:
+            return err
+        return None
+
+    LOGGER.info("Downloading jars into the jar store with %s concurrent jobs", jobs)
+    misses = jar_cache.misses
+    errors = utils.thread_map(fetch, jars, jobs)
+    failures = []
+    for mod, (_, _, jarname), err in zip(selected_mods, jars, errors):
+        if err is not None:
+            name = mod.get("name", jarname)
+            LOGGER.error("Failed to prefetch %s: %s", name, utils.err_str(err))
+            LOGGER.debug("Detailed stacktrace:\n%s", utils.err_traceback(err))
+            failures.append((name, err))
+    downloaded = jar_cache.misses - misses
+    LOGGER.info(
+        "%s jars were already stored, %s downloaded",
+        len(selected_mods) - downloaded,
+        downloaded - len(failures),
+    )
+    if failures:
+        raise PrefetchFailedError(
+            names=", ".join(name for name, _ in failures),
+            failures=[err for _, err in failures],
+        )
+    LOGGER.info("Done !")
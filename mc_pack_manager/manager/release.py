@@ -7,14 +7,17 @@ Part of the Minecraft Pack Manager utility (mpm)
 import json
 import logging
 from pathlib import Path, PurePath
-import requests
+import queue
+import shutil
 import tempfile
+import threading
 from typing import Union
 import zipfile
 
 # Local import
 from .. import manifest
 from .. import network
+from .. import utils
 from .. import _filelist
 from ..manager import common
 
@@ -22,6 +25,9 @@ LOGGER = logging.getLogger("mpm.manager.release")
 
 PathLike = Union[str, Path]
 
+# Upper bound of the memory used to buffer downloaded jars in serverfiles()
+DEFAULT_MEMORY_LIMIT = 64 * 1024 ** 2
+
 
 def add_overrides(
     archive: zipfile.ZipFile, overrides: dict, from_: Path, to: PurePath = None
@@ -46,6 +52,119 @@ def add_overrides(
         )
 
 
+def add_mods(
+    archive: zipfile.ZipFile,
+    mods: list,
+    to: PurePath,
+    spool_dir: Path,
+    jobs: int = 1,
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+):
+    """
+    Downloads mod jars into a zip archive
+
+    Jars are downloaded by jobs worker threads, while a single writer thread appends
+    them to the archive as soon as they are complete. Without a jar store, each worker
+    streams its jar into a temporary file that stays in memory up to a fixed size and
+    is rolled over to spool_dir beyond it. That size is chosen so that the jars being
+    downloaded, waiting for the writer and being written never hold more than
+    memory_limit bytes in memory. Jars are checked against the hash and size given
+    by the TwitchAPI while they are downloaded
+
+    Arguments
+        archive -- zip archive to write the jars to
+        mods -- list of (mod, jar filename) to add
+        to -- directory of the archive in which jars are written
+        spool_dir -- directory for the temporary files of jars that don't fit in memory
+        jobs -- number of concurrent downloads
+        memory_limit -- maximum number of bytes of jars held in memory at once
+
+    Raises
+        RequestFailedError -- if a jar could not be downloaded
+        ChecksumMismatchError -- if a jar is corrupted, even after retrying
+    """
+    jobs = max(1, min(jobs, len(mods)))
+    # At most jobs jars are downloading, jobs are queued and one is being written
+    spool_size = max(memory_limit // (2 * jobs + 1), network.download.get_chunk_size())
+    LOGGER.debug(
+        "Downloading with %s jobs, buffering up to %s per jar in memory",
+        jobs,
+        utils.format_size(spool_size),
+    )
+    jar_cache = network.get_jar_cache()
+    done = queue.Queue(maxsize=jobs)
+    stop = threading.Event()
+    errors = []
+
+    def fetch(mod, jarname):
+        if stop.is_set():
+            return
+        addonID, fileID = mod["addonID"], mod["fileID"]
+        try:
+            if jar_cache is not None:
+                # The writer unpins the jar once it is in the archive
+                path = jar_cache.path(addonID, fileID, jarname)
+                jar_cache.pin(path)
+                try:
+                    done.put((mod, jarname, jar_cache.fetch(addonID, fileID, jarname)))
+                except BaseException:
+                    jar_cache.unpin(path)
+                    raise
+                return
+            checksum, size = network.TwitchAPI.get_file_checksum(addonID, fileID)
+            spool = tempfile.SpooledTemporaryFile(max_size=spool_size, dir=spool_dir)
+            try:
+                network.download_to(
+                    network.TwitchAPI.get_download_url(addonID, fileID),
+                    spool,
+                    checksum=checksum,
+                    size=size,
+                )
+                spool.seek(0)
+            except BaseException:
+                spool.close()
+                raise
+            done.put((mod, jarname, spool))
+        except Exception:
+            stop.set()
+            raise
+
+    def write():
+        while True:
+            item = done.get()
+            if item is None:
+                return
+            mod, jarname, jar = item
+            try:
+                if stop.is_set() and errors:
+                    # Keep draining the queue so that workers are not blocked
+                    if not isinstance(jar, Path):
+                        jar.close()
+                    continue
+                LOGGER.info("  - %s", mod.get("name", jarname))
+                if isinstance(jar, Path):
+                    archive.write(filename=jar, arcname=to / jarname)
+                else:
+                    with jar, archive.open(str(to / jarname), mode="w") as dest:
+                        shutil.copyfileobj(jar, dest)
+            except Exception as err:
+                errors.append(err)
+                stop.set()
+            finally:
+                if isinstance(jar, Path):
+                    jar_cache.unpin(jar)
+
+    writer = threading.Thread(target=write, name="mpm-zip-writer")
+    writer.start()
+    try:
+        utils.thread_map(fetch, mods, jobs=jobs, star=True)
+    finally:
+        done.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
+
+
 def curse(
     snapshot: PathLike,
     output_zip: PathLike,
@@ -185,6 +304,8 @@ def serverfiles(
     packmodes=None,
     force=False,
     mpm_filepath=None,
+    jobs: int = 8,
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
 ):
     """
     Creates a .zip that readily contains mods and everything else for the pack. Useful to make
@@ -198,6 +319,8 @@ def serverfiles(
         force -- erase output_zip if it already exists
         mpm_filepath -- if provided, bundle this pack manager into the .zip, so that it is part of the pack.
             The argument must be the path to the "mpm.py" file
+        jobs -- number of jars downloaded concurrently
+        memory_limit -- maximum number of bytes of downloaded jars held in memory
     """
     # File checks and opening
     output_zip = Path(output_zip)
@@ -233,20 +356,27 @@ def serverfiles(
             "Downloading %s mods to zip archive. This will take a while !",
             len(selected_mods),
         )
-        mod_dir = PurePath("mods/")
-        for mod in selected_mods:
-            addonID, fileID = mod["addonID"], mod["fileID"]
-            LOGGER.info("  - %s", mod.get("name", f"{addonID}/{fileID}"))
-            if "filename" in mod:
-                jarname = mod["filename"]
-            else:
-                jarname = network.TwitchAPI.get_file_info(addonID, fileID)["fileName"]
-            archive.writestr(
-                str(mod_dir / jarname),
-                requests.get(
-                    network.TwitchAPI.get_download_url(addonID, fileID)
-                ).content,
-            )
+        file_infos = network.TwitchAPI.get_files_info(
+            (mod["addonID"], mod["fileID"]) for mod in selected_mods
+        )
+        # Resolve all download urls before the downloads start
+        network.TwitchAPI.get_download_urls(file_infos.keys())
+        add_mods(
+            archive=archive,
+            mods=[
+                (
+                    mod,
+                    mod["filename"]
+                    if "filename" in mod
+                    else file_infos[(mod["addonID"], mod["fileID"])]["fileName"],
+                )
+                for mod in selected_mods
+            ],
+            to=PurePath("mods/"),
+            spool_dir=pack_dir,
+            jobs=jobs,
+            memory_limit=memory_limit,
+        )
         # Compute overrides
         selected_overrides = manifest.pack.get_selected_overrides(
             pack_manifest, packmodes
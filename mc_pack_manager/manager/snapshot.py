@@ -48,6 +48,7 @@ def snapshot(
     snapshot: PathLike,
     version_incr: VersionIncr = 0,
     mpm_filepath=None,
+    jobs: int = 1,
 ):
     """
     Creates a pack manager representation from a curse/twitch modpack
@@ -56,6 +57,7 @@ def snapshot(
         snapshot -- path to the snapshot to create or update
         curse_zip -- path to the zip file exported by curse/twitch app
         version_incr -- which version to increase: (0 patch, 1 minor, 2 major)
+        jobs -- number of concurrent network lookups used to resolve mods
     """
     snapshot = Path(snapshot)
     curse_zip = Path(curse_zip)
@@ -90,7 +92,9 @@ def snapshot(
         ## Manifest
         curse_manifest = manifest.curse.read(temp_curse / "manifest.json")
         ## Build new modlist
-        new_modlist = common.build_new_modlist(pack_manifest, curse_manifest)
+        new_modlist = common.build_new_modlist(
+            pack_manifest, curse_manifest, jobs=jobs
+        )
         ## Build new overrides
         ### Include MPM is needed
         if mpm_filepath is not None:
@@ -6,13 +6,14 @@ Part of the Minecraft Pack Manager utility (mpm)
 # Standard library import
 from abc import ABC, abstractmethod
 import enum
+import hashlib
 import json
 import logging
 from pathlib import Path, PurePath
-import requests
 import sys
 import tempfile
-from typing import Union, List
+import threading
+from typing import Callable, List, Tuple, Union
 import urllib.parse
 import zipfile
 
@@ -30,6 +31,28 @@ PathLike = Union[str, Path]
 LOGGER = logging.getLogger("mpm.manager.update")
 
 
+class InstallFailedError(utils.AutoFormatError, Exception):
+    """
+    Some files could not be installed during an update
+
+    Attributes
+        names -- names of the files that failed to install
+        failures -- list of the exceptions that made each installation fail
+        message -- error explanation (auto-formatted, see AutoFormatError base class)
+    """
+
+    def __init__(
+        self,
+        names,
+        failures,
+        message="The update is incomplete, failed to install: {names}",
+    ):
+        super().__init__(message)
+        self.names = names
+        self.failures = failures
+        self.message = message
+
+
 class UpdateProvider(ABC):
     """
     Provides the files for the update
@@ -53,6 +76,15 @@ class UpdateProvider(ABC):
         Returns the update pack manifest as a string
         """
 
+    def get_version_info(self) -> Tuple[utils.Version, dict]:
+        """
+        Returns the pack version and the packmodes definition of the update. This is
+        all that is needed to tell if there is something to update, providers may
+        answer it without reading the whole manifest
+        """
+        remote_manifest = self.get_manifest()
+        return remote_manifest["pack-version"], remote_manifest["packmodes"]
+
     @abstractmethod
     def install_mod(self, fs: filesystem.common.FileSystem, addonID: str):
         """
@@ -60,9 +92,16 @@ class UpdateProvider(ABC):
         """
 
     @abstractmethod
-    def install_override(self, fs: filesystem.common.FileSystem, override: str):
+    def install_override(
+        self, fs: filesystem.common.FileSystem, override: str, force: bool = False
+    ):
         """
         Installs an override on the provided filesystem
+
+        Arguments
+            fs -- filesystem to install on
+            override -- path of the override, relative to the pack root
+            force -- replace the override if it already exists
         """
 
 
@@ -107,21 +146,24 @@ class LocalUpdateProvider(UpdateProvider):
             LOGGER.error("Tryied to install invalid mod with id %s, skipping", addonID)
             return
         LOGGER.info("Downloading mod %s", mod.get("name", addonID))
-        fs.download(
-            network.TwitchAPI.get_download_url(addonID, mod["fileID"]),
-            "mods/" + mod["filename"],
-        )
+        common.install_mod(fs, mod)
 
-    def install_override(self, fs: filesystem.common.FileSystem, override: str):
+    def install_override(
+        self, fs: filesystem.common.FileSystem, override: str, force: bool = False
+    ):
         if self.manifest is None:
             raise RuntimeError("UpdateProvider object must be used in a with statement")
         LOGGER.info("Copying override %s", override)
-        fs.send_file(self.root / "overrides" / override, override)
+        fs.send_file(self.root / "overrides" / override, override, force=force)
 
 
 class HTTPUpdateProvider(UpdateProvider):
     """
     Update from an HTTP(S) link
+
+    The pack-manifest.json is cached in the network cache directory along with its
+    ETag and Last-Modified, and only downloaded again if the server says it changed.
+    When it didn't, the cached manifest is only read if the update goes on
     """
 
     def __init__(self, url):
@@ -129,12 +171,13 @@ class HTTPUpdateProvider(UpdateProvider):
         if self.url.scheme not in ("http", "https"):
             raise ValueError("URL must be HTTP(s)")
         self.path = PurePath(self.url.path)
+        self._manifest = None
+        self._mod_map = None
         try:
             self._make_manifest()
         except Exception as err:
             LOGGER.debug("Exception: %s", utils.err_str(err))
             raise ValueError("URL is invalid, it doesn't have a pack-manifest.json")
-        self.mod_map = {mod["addonID"]: mod for mod in self.manifest["mods"]}
 
     def __enter__(self):
         return self
@@ -145,38 +188,124 @@ class HTTPUpdateProvider(UpdateProvider):
     def _get_url(self, subpath):
         return self.url._replace(path=(self.path / subpath).as_posix()).geturl()
 
+    def _cache_paths(self):
+        """
+        Returns the paths of the cached manifest and of its metadata, or None if the
+        caches are disabled
+        """
+        cache_dir = network.get_cache_dir()
+        if cache_dir is None:
+            return None
+        url = self._get_url("pack-manifest.json")
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        root = cache_dir / "manifests"
+        return root / (key + ".json"), root / (key + ".meta.json")
+
     def _make_manifest(self):
         url = self._get_url("pack-manifest.json")
+        paths = self._cache_paths()
+        cached = {}
+        if paths is not None and paths[0].is_file():
+            try:
+                cached = json.loads(paths[1].read_text())
+            except (OSError, ValueError):
+                cached = {}
+            if cached.get("url") != url:
+                cached = {}
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last-modified"):
+            headers["If-Modified-Since"] = cached["last-modified"]
         LOGGER.debug(f"Retrieving remote pack-manifest.json at {url}")
+        response = network.session.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            LOGGER.info("Remote pack-manifest.json didn't change since the last update")
+            self.version_info = (
+                utils.Version(cached["pack-version"]),
+                cached["packmodes"],
+            )
+            return
         try:
-            self.manifest = manifest.pack.from_str(requests.get(url).content)
+            self._manifest = manifest.pack.from_str(response.content)
         except json.JSONDecodeError as err:
             LOGGER.warn(
                 "Couldn't read the pack-manifest.json, trying again in case this is a network problem"
             )
             LOGGER.debug("Error was %s", utils.err_str(err))
-            self.manifest = manifest.pack.from_str(
-                requests.get(self._get_url("pack-manifest.json")).content
+            response = network.session.get(url)
+            self._manifest = manifest.pack.from_str(response.content)
+        self.version_info = (
+            self._manifest["pack-version"],
+            self._manifest["packmodes"],
+        )
+        if paths is not None:
+            self._save_manifest(paths, url, response)
+
+    def _save_manifest(self, paths, url, response):
+        """
+        Saves a downloaded manifest and its validators for the next update
+        """
+        path, meta_path = paths
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last-modified": response.headers.get("Last-Modified"),
+            "pack-version": str(self._manifest["pack-version"]),
+            "packmodes": self._manifest["packmodes"],
+        }
+        try:
+            # The metadata is written last: it must never describe another manifest
+            if meta_path.exists():
+                meta_path.unlink()
+            if not meta["etag"] and not meta["last-modified"]:
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(response.content)
+            meta_path.write_text(json.dumps(meta))
+        except OSError as err:
+            LOGGER.warning(
+                "Couldn't cache the pack-manifest.json: %s", utils.err_str(err)
             )
 
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            LOGGER.debug("Reading cached pack-manifest.json")
+            path, _ = self._cache_paths()
+            self._manifest = manifest.pack.from_str(path.read_bytes())
+        return self._manifest
+
+    @property
+    def mod_map(self):
+        if self._mod_map is None:
+            self._mod_map = {mod["addonID"]: mod for mod in self.manifest["mods"]}
+        return self._mod_map
+
     def get_manifest(self):
         return self.manifest
 
+    def get_version_info(self):
+        return self.version_info
+
     def install_mod(self, fs: filesystem.common.FileSystem, addonID: str):
         mod = self.mod_map.get(addonID, None)
         if mod is None:
             LOGGER.error("Tryied to install invalid mod with id %s, skipping", addonID)
             return
         LOGGER.info("Downloading mod %s", mod.get("name", addonID))
-        fs.download(
-            network.TwitchAPI.get_download_url(addonID, mod["fileID"]),
-            "mods/" + mod["filename"],
-        )
+        common.install_mod(fs, mod)
 
-    def install_override(self, fs: filesystem.common.FileSystem, override: str):
+    def install_override(
+        self, fs: filesystem.common.FileSystem, override: str, force: bool = False
+    ):
         LOGGER.info("Downloading override %s", override)
+        hsh = self.manifest["override-cache"].get(override)
         fs.download(
-            self._get_url(f"overrides/{override}"), override,
+            self._get_url(f"overrides/{override}"),
+            override,
+            force=force,
+            checksum=None if hsh is None else "sha256:" + hsh,
         )
 
 
@@ -225,20 +354,75 @@ class InstallType(enum.Enum):
 
 
 def update(
-    source, install, source_type: UpdateType, install_type: InstallType, packmodes
+    source,
+    install,
+    source_type: UpdateType,
+    install_type: InstallType,
+    packmodes,
+    jobs: int = 1,
 ):
     UpdateProviderConstructor = UpdateType(source_type)
     FileSystemConstructor = InstallType(install_type)
     with FileSystemConstructor(install) as fs, UpdateProviderConstructor(
         source
     ) as provider:
-        return update_pack(provider, fs, packmodes)
+        return update_pack(provider, fs, packmodes, jobs=jobs)
+
+
+def run_installs(
+    fs: filesystem.common.FileSystem,
+    installs: List[Tuple[str, Callable[[filesystem.common.FileSystem], None]]],
+    jobs: int = 1,
+) -> List[Tuple[str, Exception]]:
+    """
+    Runs installation functions concurrently. Each worker thread uses its own clone
+    of the filesystem (see FileSystem.clone(), FTP filesystems share their pool of
+    connections)
+
+    Arguments
+        fs -- the filesystem to install on
+        installs -- list of (name, function) pairs. Functions take the filesystem to
+            install on as sole argument
+        jobs -- number of concurrent installations
+
+    Returns
+        The list of (name, exception) of the installations that failed
+    """
+    local = threading.local()
+    lock = threading.Lock()
+    clones = []
+
+    def worker_fs():
+        if not hasattr(local, "fs"):
+            local.fs = fs.clone() if jobs > 1 else fs
+            with lock:
+                clones.append(local.fs)
+        return local.fs
+
+    def run(install):
+        name, function = install
+        try:
+            function(worker_fs())
+        except Exception as err:
+            LOGGER.error("Failed to install %s: %s", name, utils.err_str(err))
+            LOGGER.debug("Detailed stacktrace:\n%s", utils.err_traceback(err))
+            return name, err
+        return None
+
+    try:
+        results = utils.thread_map(run, installs, jobs)
+    finally:
+        for clone in clones:
+            if clone is not fs:
+                clone.close()
+    return [result for result in results if result is not None]
 
 
 def update_pack(
     update: UpdateProvider,
     fs: filesystem.common.FileSystem,
     packmodes: List[str] = None,
+    jobs: int = 1,
 ):
     """
     Performs a pack update
@@ -246,6 +430,12 @@ def update_pack(
     Arguments
         update -- UpdateProvied object that will provide update files
         fs -- a filesystem object to the pack to update
+        packmodes -- packmodes to update to. Defaults to the currently installed ones
+        jobs -- number of mods installed concurrently
+
+    Raises
+        InstallFailedError -- if some files couldn't be installed. The update is
+            applied as much as possible, but the local manifest is not updated
     """
     LOGGER.info("Starting update")
     # Get local configuration
@@ -266,7 +456,7 @@ def update_pack(
             sys.exit(1)
     # Get remote configuration
     LOGGER.info("Reading update manifest")
-    remote_manifest = update.get_manifest()
+    remote_version, remote_packmodes = update.get_version_info()
     # Verify packmodes
     if not packmodes:
         if "current-packmodes" in local_manifest:
@@ -276,7 +466,7 @@ def update_pack(
                 ", ".join(packmodes),
             )
         else:
-            packmodes = list(remote_manifest["packmodes"].keys())
+            packmodes = list(remote_packmodes.keys())
             LOGGER.info(
                 "No packmodes provided for update, no previous packmodes, defaulting to all packmodes"
             )
@@ -285,11 +475,11 @@ def update_pack(
         local_manifest["packmodes"], local_manifest.get("current-packmodes", [])
     )
     new_packmodes = manifest.pack.get_all_dependencies(
-        remote_manifest["packmodes"], packmodes
+        remote_packmodes, packmodes
     )
     # Quick comparison
     if (
-        remote_manifest["pack-version"] == local_manifest["pack-version"]
+        remote_version == local_manifest["pack-version"]
         and local_packmodes == new_packmodes
     ):
         LOGGER.info("Nothing to update !")
@@ -297,9 +487,10 @@ def update_pack(
     else:
         LOGGER.info(
             "Updating to version %s with packmodes: %s (includes dependencies)",
-            remote_manifest["pack-version"],
+            remote_version,
             ", ".join(packmode for packmode in sorted(new_packmodes)),
         )
+    remote_manifest = update.get_manifest()
     # Update mods
     LOGGER.info("Updating mods")
     LOGGER.info("Comparing old and new states")
@@ -311,17 +502,36 @@ def update_pack(
     LOGGER.info("Applying mod difference")
     mod_dir = Path("mods")
     local_mod_map = {mod["addonID"]: mod for mod in local_manifest["mods"]}
-    for addonID in mod_diff.deleted:
-        mod = local_mod_map[addonID]
-        LOGGER.info("Deleting mod %s", mod["name"])
-        fs.unlink(mod_dir / mod["filename"])
-    for addonID in mod_diff.updated:
+    remote_mod_map = {mod["addonID"]: mod for mod in remote_manifest["mods"]}
+    # Resolve all download urls at once instead of once per mod
+    files = [
+        (addonID, remote_mod_map[addonID]["fileID"])
+        for addonID in sorted(mod_diff.updated | mod_diff.added)
+    ]
+    network.TwitchAPI.get_download_urls(files, jobs)
+    for addonID in sorted(mod_diff.deleted | mod_diff.updated):
         mod = local_mod_map[addonID]
         LOGGER.info("Deleting mod %s", mod["name"])
         fs.unlink(mod_dir / mod["filename"])
-        update.install_mod(filesystem, addonID)
-    for addonID in mod_diff.added:
-        update.install_mod(fs, addonID)
+    to_install = sorted(mod_diff.updated | mod_diff.added)
+    if to_install:
+        LOGGER.info(
+            "Installing %s mods with %s concurrent jobs", len(to_install), jobs
+        )
+        fs.make_dirs([mod_dir])
+    failures = run_installs(
+        fs,
+        [
+            (
+                remote_mod_map[addonID].get("name", str(addonID)),
+                lambda worker_fs, addonID=addonID: update.install_mod(
+                    worker_fs, addonID
+                ),
+            )
+            for addonID in to_install
+        ],
+        jobs,
+    )
 
     # Update overrides
     LOGGER.info("Updating overrides")
@@ -337,12 +547,34 @@ def update_pack(
     for override in override_diff.deleted:
         LOGGER.info("Deleting override %s", override)
         fs.unlink(override)
-    for override in override_diff.updated:
-        LOGGER.info("Deleting override %s", override)
-        fs.unlink(override)
-        update.install_override(fs, override)
-    for override in override_diff.added:
-        update.install_override(fs, override)
+    # Create the directories of the new overrides at once rather than per file
+    fs.make_dirs(
+        {
+            PurePath(override).parent
+            for override in override_diff.updated | override_diff.added
+        }
+    )
+    # Overrides are replaced in place, so that a failed download keeps the old file
+    # instead of leaving nothing. Added overrides may already be there, left by a
+    # previous run that failed before writing the manifest
+    failures += run_installs(
+        fs,
+        [
+            (
+                override,
+                lambda worker_fs, override=override: update.install_override(
+                    worker_fs, override, force=True
+                ),
+            )
+            for override in sorted(override_diff.updated | override_diff.added)
+        ],
+        jobs,
+    )
+    if failures:
+        raise InstallFailedError(
+            names=", ".join(name for name, _ in failures),
+            failures=[err for _, err in failures],
+        )
     # Write new manifest to save current state
     new_manifest = manifest.pack.copy(
         remote_manifest, current_packmodes=list(packmodes)
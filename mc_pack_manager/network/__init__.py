@@ -0,0 +1,120 @@
+"""
+Network package - web APIs, downloads and their caches
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library imports
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+# Local imports
+from .. import utils
+from ..network import download
+from ..network import jars
+from ..network import metrics
+from ..network import mirrors
+from ..network import ratelimit
+from ..network import session
+from ..network.cache import DEFAULT_ADDON_TTL, DEFAULT_CACHE_DIR, MetadataCache
+from ..network.common import (
+    ChecksumMismatchError,
+    CircuitOpenError,
+    NetworkBaseError,
+    RequestFailedError,
+)
+from ..network.download import DEFAULT_CHUNK_SIZE, download_file, download_to
+from ..network.jars import DEFAULT_JAR_CACHE_SIZE, JarCache, get_jar_cache
+from ..network.mirrors import Mirror, MirrorList
+from ..network.ratelimit import DEFAULT_API_RATE, DEFAULT_CDN_RATE, TokenBucket
+from ..network.retry import CircuitBreaker, RetryPolicy
+from ..network.session import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_READ_TIMEOUT,
+)
+from ..network.twitch import TwitchAPI
+
+LOGGER = utils.getLogger(__name__)
+
+_CACHE_DIR = None
+
+
+def configure(
+    cache_dir: Union[str, Path, None] = DEFAULT_CACHE_DIR,
+    addon_ttl: Optional[float] = DEFAULT_ADDON_TTL,
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: float = DEFAULT_READ_TIMEOUT,
+    jar_cache_size: int = DEFAULT_JAR_CACHE_SIZE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    api_rate: Optional[float] = DEFAULT_API_RATE,
+    cdn_rate: Optional[float] = DEFAULT_CDN_RATE,
+    metrics_file: Union[str, Path, None] = None,
+    mirror_templates: Sequence[str] = (),
+):
+    """
+    Configures the network layer for the current process
+
+    Arguments
+        cache_dir -- directory of the persistent caches. None disables them
+        addon_ttl -- number of seconds cached addon infos stay valid
+        pool_connections -- number of hosts to keep HTTP connections alive for
+        pool_maxsize -- maximum number of HTTP connections kept alive per host
+        connect_timeout -- seconds to wait for a connection to a server
+        read_timeout -- seconds to wait for data from a server, between two reads
+        jar_cache_size -- maximum size of the jar store, in bytes
+        chunk_size -- number of bytes held in memory at once by a download
+        api_rate -- maximum requests per second to the metadata API. None or 0
+            disables the limit
+        cdn_rate -- maximum downloads per second from the CDN. None or 0 disables
+            the limit
+        metrics_file -- path of the JSON report of the network metrics, written by
+            close(). None writes no report
+        mirror_templates -- url templates of the download mirrors, tried before the
+            CDN, see network.mirrors.Mirror
+    """
+    global _CACHE_DIR
+    close()
+    session.configure(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+    )
+    download.configure(chunk_size=chunk_size)
+    ratelimit.configure(api_rate=api_rate, cdn_rate=cdn_rate)
+    metrics.configure(report_path=metrics_file)
+    mirrors.configure(mirror_templates)
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        LOGGER.debug("Using cache directory %s", cache_dir)
+        _CACHE_DIR = cache_dir
+        TwitchAPI.STORE = MetadataCache(cache_dir / "metadata.sqlite", addon_ttl)
+        jars.configure(cache_dir / "jars", max_size=jar_cache_size)
+
+
+def get_cache_dir() -> Optional[Path]:
+    """
+    Returns the directory of the persistent caches, or None if they are disabled
+    """
+    return _CACHE_DIR
+
+
+def close():
+    """
+    Releases the resources acquired by configure(), logging cache statistics and
+    writing the metrics report
+    """
+    global _CACHE_DIR
+    _CACHE_DIR = None
+    metrics.close()
+    if TwitchAPI.STORE is not None:
+        TwitchAPI.STORE.log_stats()
+        TwitchAPI.STORE.close()
+        TwitchAPI.STORE = None
+    jars.close()
+    mirrors.close()
+    ratelimit.close()
+    session.close()
@@ -0,0 +1,187 @@
+"""
+Persistent cache for network metadata
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+# Local import
+from .. import utils
+
+LOGGER = utils.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "mpm"
+# Addon info (name, latest files...) changes over time, file info does not
+DEFAULT_ADDON_TTL = 24 * 60 * 60
+
+
+class MetadataCache:
+    """
+    On-disk cache of the Twitch API JSON answers, stored in a single SQLite file
+
+    Addons are keyed by addonID and expire after addon_ttl seconds. Files and their
+    download urls are keyed by "addonID/fileID" and never expire, since a fileID always
+    refers to the same file. The object is safe to use from several threads
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS addons (key TEXT PRIMARY KEY, data TEXT NOT NULL, fetched REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS urls (key TEXT PRIMARY KEY, url TEXT NOT NULL)",
+    )
+    TABLES = ("addons", "files", "urls")
+
+    def __init__(self, path: PathLike, addon_ttl: Optional[float] = DEFAULT_ADDON_TTL):
+        """
+        Opens (and creates if needed) a metadata cache
+
+        Arguments
+            path -- path to the SQLite file to use
+            addon_ttl -- number of seconds an addon info stays valid. None never expires
+        """
+        self.path = Path(path)
+        self.addon_ttl = addon_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.db:
+            for statement in self.SCHEMA:
+                self.db.execute(statement)
+        self.purge()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _expired(self, fetched: float) -> bool:
+        return self.addon_ttl is not None and time.time() - fetched > self.addon_ttl
+
+    def _lookup(self, table: str, key: str):
+        with self.lock:
+            row = self.db.execute(
+                f"SELECT * FROM {table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and table == "addons" and self._expired(row[2]):
+                LOGGER.debug("Evicting expired info for addon %s", key)
+                with self.db:
+                    self.db.execute("DELETE FROM addons WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[1] if table == "urls" else json.loads(row[1])
+
+    def get_addon(self, addonID) -> Optional[dict]:
+        """
+        Returns the cached info of an addon, or None if it is missing or expired
+        """
+        return self._lookup("addons", str(addonID))
+
+    def put_addon(self, addonID, info: dict):
+        """
+        Stores an addon info in the cache
+        """
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO addons VALUES (?, ?, ?)",
+                (str(addonID), json.dumps(info), time.time()),
+            )
+
+    def get_file(self, addonID, fileID) -> Optional[dict]:
+        """
+        Returns the cached info of an addon file, or None if it is missing
+        """
+        return self._lookup("files", "%s/%s" % (addonID, fileID))
+
+    def put_file(self, addonID, fileID, info: dict):
+        """
+        Stores an addon file info in the cache
+        """
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?)",
+                ("%s/%s" % (addonID, fileID), json.dumps(info)),
+            )
+
+    def get_url(self, addonID, fileID) -> Optional[str]:
+        """
+        Returns the cached download url of an addon file, or None if it is missing
+        """
+        return self._lookup("urls", "%s/%s" % (addonID, fileID))
+
+    def put_url(self, addonID, fileID, url: str):
+        """
+        Stores the download url of an addon file in the cache
+        """
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?)",
+                ("%s/%s" % (addonID, fileID), url),
+            )
+
+    def count(self):
+        """
+        Returns the number of stored addon infos, file infos and download urls
+        """
+        with self.lock:
+            return tuple(
+                self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in self.TABLES
+            )
+
+    def clear(self):
+        """
+        Removes all stored infos
+        """
+        with self.lock, self.db:
+            for table in self.TABLES:
+                self.db.execute(f"DELETE FROM {table}")
+
+    def purge(self):
+        """
+        Removes all expired addon infos
+        """
+        if self.addon_ttl is None:
+            return
+        with self.lock, self.db:
+            count = self.db.execute(
+                "DELETE FROM addons WHERE fetched < ?", (time.time() - self.addon_ttl,)
+            ).rowcount
+            self.evictions += count
+        if count:
+            LOGGER.debug("Evicted %s expired addon infos from %s", count, self.path)
+
+    def log_stats(self, level=logging.INFO):
+        """
+        Logs the hit, miss and eviction counters
+        """
+        LOGGER.log(
+            level,
+            "Metadata cache: %s hits, %s misses, %s evictions",
+            self.hits,
+            self.misses,
+            self.evictions,
+        )
+
+    def close(self):
+        """
+        Closes the underlying database
+        """
+        with self.lock:
+            self.db.close()
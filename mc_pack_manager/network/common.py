@@ -0,0 +1,65 @@
+"""
+Common code for the network package
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Local imports
+from .. import utils
+
+
+class NetworkBaseError(Exception):
+    """
+    Base error for network operations
+    """
+
+
+class RequestFailedError(NetworkBaseError, utils.AutoFormatError):
+    """
+    A web request could not be completed, even after retrying
+    """
+
+    def __init__(
+        self, url, reason, message="Request to {url} failed: {reason}", status=None,
+    ):
+        super().__init__(message)
+        self.url = url
+        self.reason = reason
+        self.message = message
+        # HTTP status of the last answer, if the server answered
+        self.status = status
+
+
+class CircuitOpenError(NetworkBaseError, utils.AutoFormatError):
+    """
+    Too many requests to a host failed recently, it is not contacted for a while
+    """
+
+    def __init__(
+        self,
+        host,
+        retry_in,
+        message="Host {host} is failing, not contacting it for {retry_in:.1f}s",
+    ):
+        super().__init__(message)
+        self.host = host
+        self.retry_in = retry_in
+        self.message = message
+
+
+class ChecksumMismatchError(NetworkBaseError, utils.AutoFormatError):
+    """
+    A downloaded file doesn't have the expected content, even after retrying
+    """
+
+    def __init__(
+        self,
+        url,
+        expected,
+        actual,
+        message="Download of {url} is corrupted: expected {expected}, got {actual}",
+    ):
+        super().__init__(message)
+        self.url = url
+        self.expected = expected
+        self.actual = actual
+        self.message = message
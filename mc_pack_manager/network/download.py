@@ -0,0 +1,451 @@
+"""
+Streaming file downloads
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Union
+import urllib.parse
+
+# Third party import
+import requests
+
+# Local import
+from .. import utils
+from ..network import metrics
+from ..network import mirrors
+from ..network import ratelimit
+from ..network import session
+from ..network.common import (
+    ChecksumMismatchError,
+    CircuitOpenError,
+    RequestFailedError,
+)
+from ..network.retry import RetryPolicy
+from ..network.twitch import TwitchAPI
+
+LOGGER = utils.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_LOCK = threading.Lock()
+_CHUNK_SIZE = DEFAULT_CHUNK_SIZE
+
+
+def configure(chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Configures the downloads
+
+    Arguments
+        chunk_size -- number of bytes held in memory at once by a download
+    """
+    global _CHUNK_SIZE
+    with _LOCK:
+        _CHUNK_SIZE = chunk_size
+
+
+def get_chunk_size() -> int:
+    """
+    Returns the configured download chunk size, in bytes
+    """
+    with _LOCK:
+        return _CHUNK_SIZE
+
+
+def _validator(response: requests.Response):
+    """
+    Returns a value usable in a If-Range header to check the resource didn't change
+    """
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+class _Verifier:
+    """
+    Checks the content of a download as it is received
+    """
+
+    def __init__(self, checksum: str = None, size: int = None):
+        self.checksum = checksum
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.received = 0
+        self.hasher = None
+        if self.checksum is not None:
+            self.hasher = hashlib.new(self.checksum.split(":", 1)[0])
+
+    def update(self, data: bytes):
+        self.received += len(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+
+    def error(self):
+        """
+        Returns (expected, actual) if the received content is wrong, else None
+        """
+        if self.size is not None and self.received != self.size:
+            return "%s bytes" % self.size, "%s bytes" % self.received
+        if self.hasher is not None:
+            actual = "%s:%s" % (self.hasher.name, self.hasher.hexdigest())
+            if actual != self.checksum.lower():
+                return self.checksum, actual
+        return None
+
+
+def _download(
+    url: str,
+    fp,
+    offset: int = 0,
+    validator: str = None,
+    on_validator: Callable[[str], None] = None,
+    chunk_size: int = None,
+    checksum: str = None,
+    size: int = None,
+    policy: RetryPolicy = None,
+    verifier: _Verifier = None,
+    **kwargs
+) -> int:
+    """
+    Streams an url into a file-like object, retrying interrupted transfers as per
+    TwitchAPI.RETRY_POLICY. Retries resume at the bytes already received with a Range
+    request, guarded by If-Range so that a changed file is sent whole again. Each
+    attempt counts against the CDN rate limit, if url is on the CDN
+
+    Arguments
+        url -- url to download
+        fp -- seekable binary file-like object, positioned after the offset bytes
+            already downloaded
+        offset -- number of bytes of the url already in fp
+        validator -- ETag or Last-Modified the offset bytes were downloaded with
+        on_validator -- called with the validator of each response, if any
+        chunk_size -- size of the chunks. Defaults to the configured chunk size
+        checksum -- expected "<algorithm>:<hex digest>" of the content, with a
+            hashlib algorithm name. The hash is computed while downloading
+        size -- expected size of the content, in bytes
+        policy -- retry policy to use instead of TwitchAPI.RETRY_POLICY
+        verifier -- _Verifier that already received the offset bytes. Without it,
+            they are read back from fp to be verified
+        kwargs -- passed to requests
+
+    Returns
+        The size of the downloaded content
+
+    Raises
+        RequestFailedError -- if the download failed, even after retrying
+        ChecksumMismatchError -- if the content is still wrong after retrying. fp is
+            truncated back to its initial position
+    """
+    start = fp.tell() - offset
+    if verifier is None:
+        verifier = _Verifier(checksum, size)
+        if offset:
+            # Hash the data already downloaded
+            fp.seek(start)
+            for data in iter(lambda: fp.read(get_chunk_size()), b""):
+                verifier.update(data)
+    chunk_size = chunk_size or get_chunk_size()
+    policy = policy or TwitchAPI.RETRY_POLICY
+    if policy.timeout is not None:
+        kwargs.setdefault("timeout", policy.timeout)
+    breaker = TwitchAPI.CIRCUIT_BREAKER
+    host = urllib.parse.urlparse(url).netloc
+    headers = dict(kwargs.pop("headers", {}))
+    attempt = 0
+    received = 0
+    ok = False
+    started = time.monotonic()
+    waited = 0.0
+    try:
+        while True:
+            attempt += 1
+            if offset and validator:
+                LOGGER.debug("Resuming download of %s at byte %s", url, offset)
+                headers["Range"] = "bytes=%s-" % offset
+                headers["If-Range"] = validator
+            else:
+                headers.pop("Range", None)
+                headers.pop("If-Range", None)
+            breaker.check(host)
+            waited += ratelimit.acquire(ratelimit.download_kind(url))
+            try:
+                with session.get(
+                    url, stream=True, headers=headers, **kwargs
+                ) as response:
+                    if response.status_code == 416 or (
+                        response.ok and response.status_code != 206
+                    ):
+                        # Whole content (again), or the partial data is invalid
+                        fp.seek(start)
+                        fp.truncate()
+                        offset = 0
+                        verifier.reset()
+                    if response.status_code == 416:
+                        validator = None
+                        raise requests.RequestException("Range not satisfiable")
+                    if not response.ok:
+                        raise requests.HTTPError(
+                            "HTTP status %s" % response.status_code, response=response
+                        )
+                    breaker.record_success(host)
+                    validator = _validator(response)
+                    if on_validator is not None:
+                        on_validator(validator)
+                    expected = response.headers.get("Content-Length")
+                    expected = None if expected is None else offset + int(expected)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        fp.write(chunk)
+                        verifier.update(chunk)
+                        offset += len(chunk)
+                        received += len(chunk)
+                if expected is not None and offset != expected:
+                    raise requests.RequestException(
+                        "Received %s bytes out of %s" % (offset, expected)
+                    )
+                mismatch = verifier.error()
+                if mismatch is None:
+                    LOGGER.debug(
+                        "Downloaded %s from %s", utils.format_size(offset), url
+                    )
+                    ok = True
+                    return offset
+                # Start over, the partial data can't be trusted either
+                fp.seek(start)
+                fp.truncate()
+                offset, validator = 0, None
+                verifier.reset()
+                if attempt >= policy.max_attempts:
+                    raise ChecksumMismatchError(url, *mismatch)
+                LOGGER.warning(
+                    "Download of %s is corrupted (expected %s, got %s), downloading it again",
+                    url,
+                    *mismatch,
+                )
+            except requests.RequestException as err:
+                status = getattr(err.response, "status_code", None)
+                if status is not None and not policy.is_retryable(status):
+                    breaker.record_success(host)
+                    raise RequestFailedError(
+                        url=url, reason=utils.err_str(err), status=status
+                    )
+                breaker.record_failure(host)
+                LOGGER.debug(
+                    "Download of %s failed on trial %s: %s",
+                    url,
+                    attempt,
+                    utils.err_str(err),
+                )
+                if attempt >= policy.max_attempts:
+                    raise RequestFailedError(
+                        url=url, reason=utils.err_str(err), status=status
+                    )
+                delay = policy.delay(attempt, err.response)
+                LOGGER.debug("Retrying in %.2fs", delay)
+                policy.sleep(delay)
+    finally:
+        metrics.record_request(
+            url,
+            "download",
+            time.monotonic() - started - waited,
+            size=received,
+            retries=max(0, attempt - 1),
+            ok=ok,
+        )
+
+
+def _download_mirrored(
+    url: str,
+    fp,
+    offset: int = 0,
+    validator: str = None,
+    validator_url: str = None,
+    on_validator: Callable[[str, str], None] = None,
+    **kwargs
+) -> int:
+    """
+    Downloads an url from the best of the configured mirrors (see network.mirrors),
+    failing over to the next one when a mirror fails. Arguments are those of
+    _download(), except that validator is only used for validator_url, and
+    on_validator is called with the url the validator applies to
+
+    fp is only read back if offset bytes were already in it: the content received
+    from a failed mirror is verified as it arrives, so that sinks without read(),
+    such as FTP upload streams, can fail over
+
+    Raises
+        RequestFailedError -- if no mirror could provide the file
+        ChecksumMismatchError -- if the content from the last mirror is wrong
+    """
+    mirror_list = mirrors.get_mirrors()
+    candidates = mirror_list.candidates(url)
+    start = fp.tell() - offset
+    verifier = _Verifier(kwargs.get("checksum"), kwargs.get("size"))
+    if offset:
+        # Hash the data already downloaded
+        fp.seek(start)
+        for data in iter(lambda: fp.read(get_chunk_size()), b""):
+            verifier.update(data)
+    for index, (mirror, mirror_url) in enumerate(candidates):
+        last = index == len(candidates) - 1
+        if mirror_url != url:
+            LOGGER.debug("Downloading %s from mirror %s", url, mirror.name)
+        started = time.monotonic()
+        try:
+            size = _download(
+                mirror_url,
+                fp,
+                offset=offset,
+                validator=validator if mirror_url == validator_url else None,
+                on_validator=None
+                if on_validator is None
+                else lambda value, mirror_url=mirror_url: on_validator(
+                    mirror_url, value
+                ),
+                policy=None if last else mirror_list.failover_policy,
+                verifier=verifier,
+                **kwargs
+            )
+        except (RequestFailedError, ChecksumMismatchError, CircuitOpenError) as err:
+            if getattr(err, "status", None) in (404, 410):
+                # The mirror doesn't have the file, that says nothing of its health
+                mirror.record_miss()
+            else:
+                mirror_list.record_failure(mirror)
+            if last:
+                raise
+            LOGGER.info(
+                "Mirror %s failed for %s, trying the next one: %s",
+                mirror.name,
+                url,
+                utils.err_str(err),
+            )
+        else:
+            mirror.record_success(size - offset, time.monotonic() - started)
+            return size
+        offset = fp.tell() - start
+
+
+def download_to(
+    url: str,
+    fp,
+    chunk_size: int = None,
+    checksum: str = None,
+    size: int = None,
+    **kwargs
+) -> int:
+    """
+    Streams the content of an url into a binary file-like object. Interrupted
+    transfers are retried and resumed, see download_file()
+
+    Arguments
+        url -- url to download
+        fp -- binary file-like object with write(), tell(), seek() to its start and
+            truncate() methods
+        chunk_size -- size of the chunks. Defaults to the configured chunk size
+        checksum -- expected "<algorithm>:<hex digest>" of the content
+        size -- expected size of the content, in bytes
+        kwargs -- passed to requests
+
+    Returns
+        The number of bytes written
+
+    Raises
+        RequestFailedError -- if the download failed, even after retrying
+        ChecksumMismatchError -- if the content is still wrong after retrying
+    """
+    return _download_mirrored(
+        url, fp, chunk_size=chunk_size, checksum=checksum, size=size, **kwargs
+    )
+
+
+def download_file(
+    url: str,
+    dest: Union[str, Path],
+    chunk_size: int = None,
+    checksum: str = None,
+    size: int = None,
+    **kwargs
+) -> int:
+    """
+    Downloads an url into a local file, resuming interrupted downloads
+
+    The data is written to <dest>.part and moved to dest once complete. Interrupted
+    transfers are retried as per TwitchAPI.RETRY_POLICY, and resumed with a Range
+    request when the server supports it. The ETag or Last-Modified of the first
+    response is saved in <dest>.part.json and sent as If-Range, so that the server
+    sends the whole file again if it changed. A partial file left by a previous
+    run is resumed the same way
+
+    The file is downloaded from the best configured mirror (see network.mirrors),
+    failing over to the next ones and eventually to url itself
+
+    When a checksum or size is given, the content is verified as it is received and
+    downloaded again if it doesn't match. dest is only replaced by verified content
+
+    Arguments
+        url -- url to download
+        dest -- local file to write
+        chunk_size -- size of the chunks. Defaults to the configured chunk size
+        checksum -- expected "<algorithm>:<hex digest>" of the file, with a hashlib
+            algorithm name, e.g. "sha256:9f86d0..."
+        size -- expected size of the file, in bytes
+        kwargs -- passed to requests
+
+    Returns
+        The size of the downloaded file
+
+    Raises
+        RequestFailedError -- if the download failed, even after retrying
+        ChecksumMismatchError -- if the file is still wrong after retrying
+    """
+    dest = Path(dest)
+    part = dest.with_name(dest.name + ".part")
+    meta = dest.with_name(dest.name + ".part.json")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    validator = validator_url = None
+    if part.exists():
+        try:
+            saved = json.loads(meta.read_text())
+            validator_url, validator = saved.get("url"), saved.get("validator")
+        except (OSError, ValueError):
+            pass
+
+    def save_validator(source, validator):
+        if validator:
+            meta.write_text(json.dumps({"url": source, "validator": validator}))
+        elif meta.exists():
+            meta.unlink()
+
+    try:
+        with part.open("r+b" if part.exists() else "w+b") as f:
+            offset = f.seek(0, os.SEEK_END)
+            size = _download_mirrored(
+                url,
+                f,
+                offset=offset,
+                validator=validator,
+                validator_url=validator_url,
+                on_validator=save_validator,
+                chunk_size=chunk_size,
+                checksum=checksum,
+                size=size,
+                **kwargs
+            )
+    except ChecksumMismatchError:
+        part.unlink()
+        if meta.exists():
+            meta.unlink()
+        raise
+    os.replace(part, dest)
+    if meta.exists():
+        meta.unlink()
+    return size
@@ -0,0 +1,492 @@
+"""
+Local stand-in for the Curse (Twitch) API and its download CDN, serving generated
+fixtures. Used to measure and check the network code offline and repeatably
+
+Point TwitchAPI.ROOT to FakeCurseServer.root to use it. Run this module to start a
+standalone server:
+
+    python -m mc_pack_manager.network.fakeserver --mods 300 --latency 0.05
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import argparse
+import email.utils
+import hashlib
+import http.server
+import json
+import random
+import re
+import threading
+import time
+from typing import Optional, Sequence, Tuple
+
+# Local import
+from .. import utils
+
+LOGGER = utils.getLogger(__name__)
+
+API_PATH = "/api/v2"
+CDN_PATH = "/files"
+# Last-Modified of all the jars, they never change
+JAR_DATE = email.utils.formatdate(0, usegmt=True)
+
+
+class Fixtures:
+    """
+    Deterministic set of addons, each with a single file. Addon IDs start at 1000,
+    file IDs at 100000, and jar contents are derived from their fileID
+    """
+
+    def __init__(self, count: int = 300, jar_size: int = 256 * 1024, seed: int = 0):
+        """
+        Generates the fixtures
+
+        Arguments
+            count -- number of addons
+            jar_size -- average size of the jars, in bytes. Actual sizes vary from half
+                to one and a half of it
+            seed -- seed of the generated sizes
+        """
+        rng = random.Random(seed)
+        self.addons = {}
+        self.files = {}
+        self._addon_files = {}
+        for i in range(count):
+            addonID, fileID = 1000 + i, 100000 + i
+            self.addons[addonID] = {"id": addonID, "name": "Fake Mod %s" % i}
+            self._addon_files[addonID] = [fileID]
+            self.files[fileID] = {
+                "id": fileID,
+                "addonID": addonID,
+                "fileName": "fakemod-%s-1.0.jar" % i,
+                "fileLength": rng.randint(jar_size // 2, jar_size * 3 // 2) or 1,
+            }
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def jar(self, fileID: int) -> bytes:
+        """
+        Returns the content of the jar of a file
+        """
+        size = self.files[fileID]["fileLength"]
+        block = hashlib.sha256(str(fileID).encode()).digest()
+        return (block * (size // len(block) + 1))[:size]
+
+    def sha1(self, fileID: int) -> str:
+        """
+        Returns the sha1 hex digest of the jar of a file
+        """
+        with self._lock:
+            if fileID not in self._hashes:
+                self._hashes[fileID] = hashlib.sha1(self.jar(fileID)).hexdigest()
+            return self._hashes[fileID]
+
+    def addon_info(self, addonID: int, cdn_root: str) -> dict:
+        """
+        Returns the API answer for an addon
+        """
+        info = dict(self.addons[addonID])
+        info["latestFiles"] = [
+            self.file_info(fileID, cdn_root) for fileID in self._addon_files[addonID]
+        ]
+        return info
+
+    def file_info(self, fileID: int, cdn_root: str) -> dict:
+        """
+        Returns the API answer for a file, with download urls pointing to cdn_root
+        """
+        file = self.files[fileID]
+        info = {key: value for key, value in file.items() if key != "addonID"}
+        info["downloadUrl"] = self.download_url(fileID, cdn_root)
+        info["hashes"] = [{"value": self.sha1(fileID), "algo": 1}]
+        return info
+
+    def download_url(self, fileID: int, cdn_root: str) -> str:
+        """
+        Returns the download url of a file
+        """
+        return "%s/%s/%s" % (cdn_root, fileID, self.files[fileID]["fileName"])
+
+    def curse_manifest(self, count: int = None) -> dict:
+        """
+        Returns a curse manifest.json listing the first count addons (defaults to all)
+        """
+        files = list(self.files.values())[:count]
+        return {
+            "minecraft": {"version": "1.12.2", "modLoaders": []},
+            "manifestType": "minecraftModpack",
+            "manifestVersion": 1,
+            "name": "Fake pack",
+            "version": "1.0.0",
+            "author": "mpm",
+            "files": [
+                {"projectID": file["addonID"], "fileID": file["id"], "required": True}
+                for file in files
+            ],
+            "overrides": "overrides",
+        }
+
+    def pack_manifest(self, count: int = None, packmode: str = "server") -> dict:
+        """
+        Returns a resolved pack-manifest.json content listing the first count addons
+        (defaults to all), all in packmode
+        """
+        return {
+            "pack-version": "1.0.0",
+            "packmodes": {},
+            "mods": [
+                {
+                    "addonID": file["addonID"],
+                    "fileID": file["id"],
+                    "packmode": packmode,
+                    "name": self.addons[file["addonID"]]["name"],
+                    "filename": file["fileName"],
+                }
+                for file in list(self.files.values())[:count]
+            ],
+            "overrides": {},
+            "override-cache": {},
+        }
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler of FakeCurseServer
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: "FakeCurseServer"
+
+    ROUTES = (
+        ("GET", re.compile(API_PATH + r"/addon/(\d+)$"), "_get_addon"),
+        ("POST", re.compile(API_PATH + r"/addon$"), "_post_addons"),
+        ("GET", re.compile(API_PATH + r"/addon/(\d+)/file/(\d+)$"), "_get_file"),
+        ("POST", re.compile(API_PATH + r"/addon/files$"), "_post_files"),
+        (
+            "GET",
+            re.compile(API_PATH + r"/addon/(\d+)/file/(\d+)/download-url$"),
+            "_get_download_url",
+        ),
+        ("GET", re.compile(CDN_PATH + r"/(\d+)/[^/]+$"), "_get_jar"),
+    )
+
+    def log_message(self, format, *args):
+        LOGGER.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        body = None
+        if method == "POST":
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        for route_method, pattern, handler in self.ROUTES:
+            match = pattern.match(self.path)
+            if route_method == method and match:
+                if method == "POST" and not self.server.batch:
+                    break
+                endpoint = handler.strip("_")
+                self.server.count(endpoint)
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                scripted = self.server.scripted(endpoint)
+                if scripted is not None:
+                    status, headers = scripted
+                    return self._send_json(
+                        {"error": "scripted"}, status=status, headers=headers.items()
+                    )
+                if self.server.roll(self.server.error_rate):
+                    return self._send_json({"error": "injected"}, status=503)
+                try:
+                    if body is not None:
+                        return getattr(self, handler)(json.loads(body))
+                    return getattr(self, handler)(*(int(g) for g in match.groups()))
+                except (KeyError, ValueError, TypeError):
+                    return self._send_json({"error": "not found"}, status=404)
+        self.server.count("unknown")
+        self._send_json({"error": "not found"}, status=404)
+
+    def _send(self, data: bytes, content_type: str, status: int = 200, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, data, status: int = 200, headers=()):
+        self._send(
+            json.dumps(data).encode("utf-8"), "application/json", status, headers
+        )
+
+    def _get_addon(self, addonID):
+        self._send_json(self.server.fixtures.addon_info(addonID, self.server.cdn_root))
+
+    def _post_addons(self, addonIDs):
+        fixtures = self.server.fixtures
+        self._send_json(
+            [
+                fixtures.addon_info(addonID, self.server.cdn_root)
+                for addonID in addonIDs
+                if addonID in fixtures.addons
+            ]
+        )
+
+    def _get_file(self, addonID, fileID):
+        if self.server.fixtures.files[fileID]["addonID"] != addonID:
+            raise KeyError(fileID)
+        self._send_json(self.server.fixtures.file_info(fileID, self.server.cdn_root))
+
+    def _post_files(self, fileIDs):
+        fixtures = self.server.fixtures
+        self._send_json(
+            {
+                str(fileID): [fixtures.file_info(fileID, self.server.cdn_root)]
+                for fileID in fileIDs
+                if fileID in fixtures.files
+            }
+        )
+
+    def _get_download_url(self, addonID, fileID):
+        if self.server.fixtures.files[fileID]["addonID"] != addonID:
+            raise KeyError(fileID)
+        url = self.server.fixtures.download_url(fileID, self.server.cdn_root)
+        self._send(url.encode("utf-8"), "text/plain")
+
+    def _get_jar(self, fileID):
+        data = self.server.fixtures.jar(fileID)
+        etag = '"%s"' % self.server.fixtures.sha1(fileID)
+        status, start = 200, 0
+        headers = [("ETag", etag), ("Last-Modified", JAR_DATE)]
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", etag) in (etag, JAR_DATE):
+            start = int(match.group(1))
+            if start >= len(data):
+                headers.append(("Content-Range", "bytes */%s" % len(data)))
+                return self._send(b"", "text/plain", 416, headers)
+            status = 206
+            headers.append(
+                ("Content-Range", "bytes %s-%s/%s" % (start, len(data) - 1, len(data)))
+            )
+        data = data[start:]
+        if self.server.roll(self.server.corrupt_rate):
+            data = data[:-1] + bytes([data[-1] ^ 0xFF])
+        cut = len(data)
+        if self.server.roll(self.server.drop_rate):
+            cut = len(data) // 2
+            self.close_connection = True
+        self.send_response(status)
+        self.send_header("Content-Type", "application/java-archive")
+        self.send_header("Content-Length", str(len(data)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self._write_throttled(data[:cut])
+
+    def _write_throttled(self, data: bytes):
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        block = max(1, min(64 * 1024, bandwidth // 10))
+        start = time.monotonic()
+        for sent in range(0, len(data), block):
+            self.wfile.write(data[sent : sent + block])
+            delay = start + (sent + block) / bandwidth - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class FakeCurseServer(http.server.ThreadingHTTPServer):
+    """
+    HTTP server imitating the Curse API and CDN. Serves in a background thread when
+    used as a context manager
+
+    Attributes
+        root -- url to use as TwitchAPI.ROOT
+        cdn_root -- url prefix of the jar downloads
+        requests -- number of requests received per endpoint
+
+    Besides the random errors, the answers of an endpoint can be scripted, see
+    script()
+    """
+
+    daemon_threads = True
+    # Accept the bursts of connections of many concurrent jobs
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        fixtures: Fixtures = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        bandwidth: Optional[int] = None,
+        error_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        corrupt_rate: float = 0.0,
+        batch: bool = True,
+        seed: int = 0,
+    ):
+        """
+        Creates the server. Use it in a with statement, or call serve_forever()
+
+        Arguments
+            fixtures -- the data to serve. Defaults to Fixtures()
+            host, port -- address to listen on. Port 0 picks a free port
+            latency -- seconds to wait before answering each request
+            bandwidth -- maximum bytes per second of each jar download. None is
+                unlimited
+            error_rate -- fraction of requests answered with a 503 error
+            drop_rate -- fraction of jar downloads cut in the middle
+            corrupt_rate -- fraction of jar downloads with a wrong byte
+            batch -- serve the multi-addon and multi-file endpoints
+            seed -- seed of the injected errors
+        """
+        super().__init__((host, port), _Handler)
+        self.fixtures = fixtures or Fixtures()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.batch = batch
+        self.requests = {}
+        # Endpoint -> [scripted responses, whether the last one repeats]
+        self._scripts = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        base = "http://%s:%s" % self.server_address[:2]
+        self.root = base + API_PATH
+        self.cdn_root = base + CDN_PATH
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="mpm-fake-curse", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
+
+    def roll(self, rate: float) -> bool:
+        """
+        Returns True with probability rate
+        """
+        if not rate:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def script(self, endpoint: str, *responses, repeat: bool = False):
+        """
+        Scripts the next answers of an endpoint, given before its normal ones
+
+        Arguments
+            endpoint -- name of the endpoint, as in requests, e.g. "get_addon"
+            responses -- HTTP statuses, or (status, headers dict) pairs, answered in
+                order
+            repeat -- keep giving the last response once the others were given,
+                e.g. for a permanent 404
+        """
+        with self._lock:
+            self._scripts[endpoint] = [
+                [
+                    (response, {}) if isinstance(response, int) else response
+                    for response in responses
+                ],
+                repeat,
+            ]
+
+    def scripted(self, endpoint: str) -> Optional[Tuple[int, dict]]:
+        """
+        Returns the next scripted (status, headers) of an endpoint, or None to
+        answer normally
+        """
+        with self._lock:
+            script = self._scripts.get(endpoint)
+            if script is None or not script[0]:
+                return None
+            responses, repeat = script
+            if len(responses) == 1 and repeat:
+                return responses[0]
+            return responses.pop(0)
+
+    def count(self, endpoint: str):
+        """
+        Counts a request to an endpoint
+        """
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def total_requests(self) -> int:
+        """
+        Returns the number of requests received so far
+        """
+        with self._lock:
+            return sum(self.requests.values())
+
+    def reset_counts(self):
+        """
+        Resets the request counters
+        """
+        with self._lock:
+            self.requests.clear()
+
+
+def main(argv: Sequence[str] = None):
+    """
+    Runs a standalone fake server until interrupted
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8080)
+    parser.add_argument("--mods", type=int, default=300, help="number of addons")
+    parser.add_argument(
+        "--jar-size", type=utils.parse_size, default=256 * 1024, help="e.g. 256K"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="in seconds")
+    parser.add_argument(
+        "--bandwidth", type=utils.parse_size, help="per download, e.g. 1M"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--no-batch",
+        action="store_false",
+        dest="batch",
+        help="don't serve the multi-addon and multi-file endpoints",
+    )
+    args = parser.parse_args(argv)
+    server = FakeCurseServer(
+        Fixtures(args.mods, args.jar_size),
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        corrupt_rate=args.corrupt_rate,
+        batch=args.batch,
+    )
+    print("Serving a fake Curse API at %s" % server.root)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
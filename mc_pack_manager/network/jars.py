@@ -0,0 +1,343 @@
+"""
+Local store of downloaded mod jars, shared across commands and installs
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import contextlib
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import List, Optional, Tuple, Union
+
+# Local import
+from .. import utils
+from ..network import download
+from ..network import metrics
+from ..network.twitch import TwitchAPI
+
+LOGGER = utils.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+DEFAULT_JAR_CACHE_SIZE = 4 * 1024 ** 3
+# Seconds between two checks of a jar being downloaded by another process
+LOCK_POLL_INTERVAL = 0.2
+# Age in seconds after which a lock file is considered left by a crashed process
+LOCK_STALE_AGE = 600.0
+
+_LOCK = threading.Lock()
+_JAR_CACHE = None
+
+
+class JarCache:
+    """
+    Stores mod jars as <root>/<addonID>/<fileID>/<filename>. A fileID always refers
+    to the same file, so stored jars never need to be refreshed
+
+    The store is bounded in size: the least recently used jars are evicted when it
+    grows beyond max_size. Jars pinned while in use (see using()) are never evicted.
+    The object is safe to use from several threads, and a store can be shared by
+    several processes: a jar is downloaded under a <jar>.lock file (see lock_file())
+    """
+
+    def __init__(self, root: PathLike, max_size: int = DEFAULT_JAR_CACHE_SIZE):
+        """
+        Opens (and creates if needed) a jar store
+
+        Arguments
+            root -- directory of the store
+            max_size -- maximum size of the store, in bytes
+        """
+        self.root = Path(root)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # Path -> [lock, number of threads using it], so that a jar is only
+        # downloaded once
+        self._fetch_locks = {}
+        # Path -> number of users of the jar, which prune() must not evict
+        self._pinned = {}
+        self._size = None
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, addonID, fileID, filename: str) -> Path:
+        """
+        Returns the path at which a jar is stored
+        """
+        return self.root / str(addonID) / str(fileID) / filename
+
+    def get(self, addonID, fileID, filename: str) -> Optional[Path]:
+        """
+        Returns the path of a stored jar, or None if it is not in the store
+        """
+        path = self.path(addonID, fileID, filename)
+        try:
+            # Stored jars are immutable, the modification time tracks the last use
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            metrics.record_cache("jar", False)
+            return None
+        with self.lock:
+            self.hits += 1
+        metrics.record_cache("jar", True)
+        return path
+
+    def fetch(self, addonID, fileID, filename: str, url: str = None) -> Path:
+        """
+        Returns the path of a jar, downloading it into the store if needed. Downloads
+        are checked against the hash and size given by the TwitchAPI
+
+        Arguments
+            addonID, fileID -- identifiers of the mod file
+            filename -- name of the jar
+            url -- download url of the jar. Resolved with the TwitchAPI if None
+        """
+        path = self.path(addonID, fileID, filename)
+        with self.lock:
+            entry = self._fetch_locks.setdefault(path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                stored = self.get(addonID, fileID, filename)
+                if stored is not None:
+                    LOGGER.debug("Using stored jar %s", stored)
+                    return stored
+                with lock_file(path):
+                    # Another process may have stored it while we waited
+                    if path.is_file():
+                        LOGGER.debug("Using jar %s stored by another process", path)
+                        return path
+                    if url is None:
+                        url = TwitchAPI.get_download_url(addonID, fileID)
+                    checksum, size = TwitchAPI.get_file_checksum(addonID, fileID)
+                    LOGGER.debug("Downloading %s into the jar store", url)
+                    # Interrupted downloads are kept and resumed on the next fetch,
+                    # corrupted ones never make it into the store
+                    size = download.download_file(
+                        url, path, checksum=checksum, size=size
+                    )
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                # Only forget the lock once no other thread waits on it
+                if entry[1] == 0:
+                    del self._fetch_locks[path]
+        self._add_size(size)
+        return path
+
+    def pin(self, path: Path):
+        """
+        Keeps a stored jar from being evicted until unpin() is called as many times
+        """
+        with self.lock:
+            self._pinned[path] = self._pinned.get(path, 0) + 1
+
+    def unpin(self, path: Path):
+        with self.lock:
+            count = self._pinned.pop(path, 0) - 1
+            if count > 0:
+                self._pinned[path] = count
+
+    @contextlib.contextmanager
+    def using(self, addonID, fileID, filename: str, url: str = None):
+        """
+        Context manager fetching a jar (see fetch()) and giving its path. The jar
+        is pinned in the store until the end of the with block
+        """
+        path = self.path(addonID, fileID, filename)
+        self.pin(path)
+        try:
+            yield self.fetch(addonID, fileID, filename, url=url)
+        finally:
+            self.unpin(path)
+
+    def entries(self) -> List[Tuple[Path, int, float]]:
+        """
+        Lists the stored jars
+
+        Returns
+            A list of (path, size, last use time) tuples
+        """
+        entries = []
+        for path in self.root.glob("*/*/*"):
+            if path.is_file() and not path.name.endswith(
+                (".part", ".part.json", ".lock")
+            ):
+                stat = path.stat()
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def size(self) -> int:
+        """
+        Returns the total size of the stored jars, in bytes
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def _add_size(self, size: int):
+        with self.lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size
+            full = self._size > self.max_size
+        if full:
+            self.prune()
+
+    def prune(self, max_size: int = None) -> Tuple[int, int]:
+        """
+        Evicts the least recently used jars until the store fits in max_size, or
+        only pinned jars are left
+
+        Arguments
+            max_size -- size to fit in, in bytes. Defaults to the store max_size
+
+        Returns
+            The number of evicted jars and the number of bytes freed
+        """
+        if max_size is None:
+            max_size = self.max_size
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            count, freed = 0, 0
+            for path, size, _ in entries:
+                if total - freed <= max_size:
+                    break
+                if path in self._pinned:
+                    continue
+                LOGGER.debug("Evicting %s from the jar store", path)
+                path.unlink()
+                for parent in (path.parent, path.parent.parent):
+                    try:
+                        parent.rmdir()
+                    except OSError:
+                        break
+                count += 1
+                freed += size
+            self.evictions += count
+            self._size = total - freed
+        if count:
+            LOGGER.info(
+                "Evicted %s jars (%s) from the jar store",
+                count,
+                utils.format_size(freed),
+            )
+        return count, freed
+
+    def clear(self) -> Tuple[int, int]:
+        """
+        Removes all stored jars
+
+        Returns
+            The number of removed jars and the number of bytes freed
+        """
+        return self.prune(max_size=0)
+
+    def log_stats(self, level=logging.INFO):
+        """
+        Logs the hit, miss and eviction counters
+        """
+        LOGGER.log(
+            level,
+            "Jar store: %s hits, %s misses, %s evictions",
+            self.hits,
+            self.misses,
+            self.evictions,
+        )
+
+
+def _is_stale(lock: Path) -> bool:
+    """
+    Tests if a lock file was left by a process that no longer runs
+    """
+    try:
+        age = time.time() - lock.stat().st_mtime
+        pid = int(lock.read_text() or 0)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        pid = 0
+    if age > LOCK_STALE_AGE:
+        return True
+    if pid and os.name == "posix":
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+    return False
+
+
+@contextlib.contextmanager
+def lock_file(path: Path):
+    """
+    Context manager holding <path>.lock, so that one process at a time writes to
+    path. The lock file is created with O_EXCL and holds the pid of its owner. Waits
+    while another process holds it, and breaks locks left by crashed processes
+    """
+    lock = path.with_name(path.name + ".lock")
+    lock.parent.mkdir(parents=True, exist_ok=True)
+    waiting = False
+    while True:
+        try:
+            fd = os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if _is_stale(lock):
+                LOGGER.debug("Breaking stale lock %s", lock)
+                with contextlib.suppress(FileNotFoundError):
+                    lock.unlink()
+            else:
+                if not waiting:
+                    LOGGER.debug("Waiting for another process to release %s", lock)
+                    waiting = True
+                time.sleep(LOCK_POLL_INTERVAL)
+            continue
+        break
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        yield
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            lock.unlink()
+
+
+def configure(root: Optional[PathLike], max_size: int = DEFAULT_JAR_CACHE_SIZE):
+    """
+    Configures the jar store used by the process
+
+    Arguments
+        root -- directory of the store. None disables the store
+        max_size -- maximum size of the store, in bytes
+    """
+    global _JAR_CACHE
+    close()
+    with _LOCK:
+        _JAR_CACHE = None if root is None else JarCache(root, max_size)
+
+
+def get_jar_cache() -> Optional[JarCache]:
+    """
+    Returns the jar store of the process, or None if it is disabled
+    """
+    with _LOCK:
+        return _JAR_CACHE
+
+
+def close():
+    """
+    Releases the jar store, logging its statistics
+    """
+    global _JAR_CACHE
+    with _LOCK:
+        if _JAR_CACHE is not None:
+            _JAR_CACHE.log_stats()
+            _JAR_CACHE = None
@@ -0,0 +1,241 @@
+"""
+Instrumentation of the network layer, summarised into a per-run report
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import json
+import math
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Iterable, Optional, Union
+import urllib.parse
+
+# Local import
+from .. import utils
+from ..network import mirrors
+from ..network import ratelimit
+
+LOGGER = utils.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+_LOCK = threading.Lock()
+_METRICS = None
+_REPORT_PATH = None
+
+
+def url_class(url: str) -> str:
+    """
+    Returns the class of an url: its path with numeric identifiers replaced, so that
+    e.g. all addon info requests are grouped together
+    """
+    return re.sub(r"/\d+(?=/|$)", "/{id}", urllib.parse.urlparse(url).path)
+
+
+def percentile(values: Iterable[float], percent: float) -> Optional[float]:
+    """
+    Returns the nearest-rank percentile of values, or None if there are none
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class Metrics:
+    """
+    Collects measurements of network requests and cache lookups. The object is safe
+    to use from several threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = []
+        self.caches = {}
+
+    def record_request(
+        self,
+        url: str,
+        kind: str,
+        latency: float,
+        size: int = 0,
+        retries: int = 0,
+        ok: bool = True,
+        by_endpoint: bool = False,
+    ):
+        """
+        Records a request, including all of its retries
+
+        Arguments
+            url -- the requested url
+            kind -- class of the request, e.g. "api" or "download"
+            latency -- seconds from the first attempt to the end of the transfer, rate
+                limiter waits excluded
+            size -- number of bytes received
+            retries -- number of attempts after the first one
+            ok -- whether the request eventually succeeded
+            by_endpoint -- split the statistics of kind by url class, see url_class()
+        """
+        entry = {
+            "host": urllib.parse.urlparse(url).netloc,
+            "class": "%s %s" % (kind, url_class(url)) if by_endpoint else kind,
+            "latency": latency,
+            "bytes": size,
+            "retries": retries,
+            "ok": ok,
+        }
+        with self.lock:
+            self.requests.append(entry)
+
+    def record_cache(self, name: str, hit: bool):
+        """
+        Records a cache lookup
+
+        Arguments
+            name -- name of the cache, e.g. "jar"
+            hit -- whether the lookup was served from the cache
+        """
+        with self.lock:
+            counts = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+            counts["hits" if hit else "misses"] += 1
+
+    @staticmethod
+    def _summary(entries: list) -> dict:
+        latencies = [entry["latency"] for entry in entries]
+        size = sum(entry["bytes"] for entry in entries)
+        busy = sum(latencies)
+        return {
+            "requests": len(entries),
+            "failures": sum(1 for entry in entries if not entry["ok"]),
+            "retries": sum(entry["retries"] for entry in entries),
+            "bytes": size,
+            "latency": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "max": max(latencies, default=None),
+                "total": busy,
+            },
+            # Average transfer speed of a single request, in bytes per second
+            "throughput": size / busy if busy else None,
+        }
+
+    def report(self) -> dict:
+        """
+        Summarises the measurements
+
+        Returns
+            A JSON-serializable dict with the statistics of requests per host and per
+            url class, the cache hit and miss counts, the rate limiter waits and the
+            health and throughput of the download mirrors
+        """
+        with self.lock:
+            requests = list(self.requests)
+            caches = {name: dict(counts) for name, counts in self.caches.items()}
+        duration = time.time() - self.started
+        grouped = {"hosts": {}, "classes": {}}
+        for entry in requests:
+            grouped["hosts"].setdefault(entry["host"], []).append(entry)
+            grouped["classes"].setdefault(entry["class"], []).append(entry)
+        for counts in caches.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_ratio"] = counts["hits"] / lookups if lookups else None
+        limits = {}
+        for kind in (ratelimit.API, ratelimit.CDN):
+            bucket = ratelimit.get_bucket(kind)
+            limits[kind] = {
+                "rate": bucket.rate,
+                "requests": bucket.acquired,
+                "waits": bucket.waits,
+                "wait_time": bucket.wait_time,
+            }
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration": duration,
+            "total": self._summary(requests),
+            "hosts": {
+                host: self._summary(entries)
+                for host, entries in sorted(grouped["hosts"].items())
+            },
+            "classes": {
+                name: self._summary(entries)
+                for name, entries in sorted(grouped["classes"].items())
+            },
+            "caches": caches,
+            "rate_limits": limits,
+            "mirrors": mirrors.get_mirrors().report(),
+        }
+
+    def write_report(self, path: PathLike):
+        """
+        Writes the report as a JSON file
+        """
+        path = Path(path)
+        LOGGER.info("Writing network metrics to %s", path)
+        path.write_text(json.dumps(self.report(), indent=4))
+
+
+def configure(report_path: Optional[PathLike] = None):
+    """
+    Starts collecting the metrics of a new run
+
+    Arguments
+        report_path -- where close() writes the JSON report. None writes no report
+    """
+    global _METRICS, _REPORT_PATH
+    with _LOCK:
+        _METRICS = Metrics()
+        _REPORT_PATH = report_path
+
+
+def get_metrics() -> Metrics:
+    """
+    Returns the metrics of the current run
+    """
+    global _METRICS
+    with _LOCK:
+        if _METRICS is None:
+            _METRICS = Metrics()
+        return _METRICS
+
+
+def record_request(*args, **kwargs):
+    """
+    Records a request in the current run, see Metrics.record_request()
+    """
+    get_metrics().record_request(*args, **kwargs)
+
+
+def record_cache(name: str, hit: bool):
+    """
+    Records a cache lookup in the current run, see Metrics.record_cache()
+    """
+    get_metrics().record_cache(name, hit)
+
+
+def close():
+    """
+    Ends the current run, writing its report if configured
+    """
+    global _METRICS, _REPORT_PATH
+    with _LOCK:
+        metrics, path = _METRICS, _REPORT_PATH
+        _METRICS = _REPORT_PATH = None
+    if metrics is None:
+        return
+    total = metrics.report()["total"]
+    LOGGER.debug(
+        "Network: %s requests, %s received, p50 latency %s, p95 latency %s",
+        total["requests"],
+        utils.format_size(total["bytes"]),
+        "-" if total["latency"]["p50"] is None else "%.3fs" % total["latency"]["p50"],
+        "-" if total["latency"]["p95"] is None else "%.3fs" % total["latency"]["p95"],
+    )
+    if path is not None:
+        try:
+            metrics.write_report(path)
+        except OSError as err:
+            LOGGER.error("Couldn't write metrics to %s: %s", path, utils.err_str(err))
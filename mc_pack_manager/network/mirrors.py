@@ -0,0 +1,291 @@
+"""
+Download mirrors: alternative sources for the files of the CDN, chosen by health
+and recent throughput
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import logging
+import string
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+import urllib.parse
+
+# Local import
+from .. import utils
+from ..network.retry import RetryPolicy
+from ..network.twitch import TwitchAPI
+
+LOGGER = utils.getLogger(__name__)
+
+# Consecutive failures after which a mirror is put aside
+DEFAULT_FAILURE_THRESHOLD = 3
+# Seconds a failing mirror is put aside for
+DEFAULT_COOLDOWN = 60.0
+# Weight of the last download in the throughput estimate of a mirror
+THROUGHPUT_SMOOTHING = 0.3
+# (connect, read) timeout of the mirrors that are not the last candidate, tighter
+# than the session one so that an unresponsive mirror is given up on quickly
+DEFAULT_FAILOVER_TIMEOUT = (5.0, 10.0)
+
+ORIGIN = "{url}"
+
+_LOCK = threading.Lock()
+_MIRRORS = None
+
+
+class Mirror:
+    """
+    A source of downloads, described by an url template. Available fields are:
+        {url} -- the CDN url
+        {path} -- the path of the CDN url, without its leading /
+        {filename} -- the last segment of the CDN url
+        {addonID}, {fileID} -- the identifiers of the mod file, if known
+
+    For instance "http://lan-host:8000/{addonID}/{fileID}/{filename}" matches the
+    layout of the jar store, served with 'mpm cache serve'
+    """
+
+    def __init__(self, template: str, priority: int = 0):
+        """
+        Arguments
+            template -- url template of the mirror
+            priority -- rank of the mirror in the configured order
+        """
+        self.template = template
+        self.priority = priority
+        self.fields = {
+            field
+            for _, field, _, _ in string.Formatter().parse(template)
+            if field is not None
+        }
+        unknown = self.fields - {"url", "path", "filename", "addonID", "fileID"}
+        if unknown:
+            raise ValueError(
+                "Unknown field(s) %s in mirror %s" % (", ".join(sorted(unknown)), template)
+            )
+        self.name = (
+            "origin"
+            if template == ORIGIN
+            else urllib.parse.urlparse(template).netloc or template
+        )
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.down_until = 0.0
+        # Estimated bytes per second, None until a download completed
+        self.throughput = None
+        # Metrics
+        self.downloads = 0
+        self.bytes = 0
+        self.errors = 0
+        self.misses = 0
+
+    def url(self, url: str) -> Optional[str]:
+        """
+        Returns the url of the mirror for a CDN url, or None if the mirror can't
+        serve it
+        """
+        path = urllib.parse.urlparse(url).path
+        values = {
+            "url": url,
+            "path": path.lstrip("/"),
+            "filename": path.rsplit("/", 1)[-1],
+        }
+        if self.fields & {"addonID", "fileID"}:
+            ids = TwitchAPI.get_file_ids(url)
+            if ids is None:
+                return None
+            values["addonID"], values["fileID"] = ids
+        return self.template.format(**values)
+
+    def is_healthy(self, now: float = None) -> bool:
+        with self.lock:
+            return self.down_until <= (time.monotonic() if now is None else now)
+
+    def record_success(self, size: int, seconds: float):
+        """
+        Records a complete download, updating the throughput estimate
+        """
+        with self.lock:
+            self.failures = 0
+            self.down_until = 0.0
+            self.downloads += 1
+            self.bytes += size
+            if seconds > 0:
+                speed = size / seconds
+                if self.throughput is None:
+                    self.throughput = speed
+                else:
+                    self.throughput += THROUGHPUT_SMOOTHING * (speed - self.throughput)
+
+    def record_failure(self, threshold: int, cooldown: float):
+        """
+        Records a failed download, putting the mirror aside after threshold
+        consecutive failures
+        """
+        with self.lock:
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= threshold:
+                if self.down_until <= time.monotonic():
+                    LOGGER.warning(
+                        "Mirror %s failed %s times in a row, avoiding it for %ss",
+                        self.name,
+                        self.failures,
+                        cooldown,
+                    )
+                self.down_until = time.monotonic() + cooldown
+
+    def record_miss(self):
+        """
+        Records a file the mirror doesn't have. This says nothing of its health
+        """
+        with self.lock:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "template": self.template,
+                "healthy": self.down_until <= time.monotonic(),
+                "throughput": self.throughput,
+                "downloads": self.downloads,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "misses": self.misses,
+            }
+
+
+class MirrorList:
+    """
+    Ordered mirrors, with the CDN itself as the last resort
+
+    Healthy mirrors are preferred to failing ones. Among healthy mirrors, those
+    without a completed download yet are tried first in the configured order, so
+    that each gets measured, then the fastest ones by recent throughput. The object
+    is safe to use from several threads
+    """
+
+    def __init__(
+        self,
+        templates: Sequence[str] = (),
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        failover_timeout: Tuple[float, float] = DEFAULT_FAILOVER_TIMEOUT,
+    ):
+        """
+        Arguments
+            templates -- url templates of the mirrors, see Mirror. The CDN is added
+                last unless listed as "{url}"
+            failure_threshold -- consecutive failures after which a mirror is put
+                aside
+            cooldown -- seconds a failing mirror is put aside for
+            failover_timeout -- (connect, read) timeout of the downloads from a
+                mirror that is not the last candidate
+        """
+        templates = list(dict.fromkeys(templates))
+        if ORIGIN not in templates:
+            templates.append(ORIGIN)
+        self.mirrors = [
+            Mirror(template, priority) for priority, template in enumerate(templates)
+        ]
+        self.origin = next(
+            mirror for mirror in self.mirrors if mirror.template == ORIGIN
+        )
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        # Mirrors that are not the last candidate are given up on quickly
+        self.failover_policy = RetryPolicy(
+            max_attempts=2, backoff_cap=2.0, timeout=failover_timeout
+        )
+
+    def __len__(self):
+        return len(self.mirrors)
+
+    def candidates(self, url: str) -> List[Tuple[Mirror, str]]:
+        """
+        Returns the (mirror, url) pairs to try for a CDN url, best first. Urls that
+        are not known mod downloads (see TwitchAPI.get_file_ids()), such as
+        overrides, are only downloaded from url itself
+        """
+        if TwitchAPI.get_file_ids(url) is None:
+            return [(self.origin, url)]
+        now = time.monotonic()
+
+        def rank(mirror):
+            throughput = mirror.throughput
+            return (
+                not mirror.is_healthy(now),
+                throughput is not None,
+                -(throughput or 0.0),
+                mirror.priority,
+            )
+
+        result = []
+        for mirror in sorted(self.mirrors, key=rank):
+            mirror_url = mirror.url(url)
+            if mirror_url is not None:
+                result.append((mirror, mirror_url))
+        return result
+
+    def record_failure(self, mirror: Mirror):
+        mirror.record_failure(self.failure_threshold, self.cooldown)
+
+    def report(self) -> dict:
+        """
+        Returns the statistics of each mirror, for the metrics report
+        """
+        return {mirror.name: mirror.stats() for mirror in self.mirrors}
+
+    def log_stats(self, level=logging.INFO):
+        for mirror in self.mirrors:
+            stats = mirror.stats()
+            LOGGER.log(
+                level,
+                "Mirror %s: %s downloads, %s, %s errors, %s missing files, %s",
+                mirror.name,
+                stats["downloads"],
+                utils.format_size(stats["bytes"]),
+                stats["errors"],
+                stats["misses"],
+                "unmeasured"
+                if stats["throughput"] is None
+                else "%s/s" % utils.format_size(int(stats["throughput"])),
+            )
+
+
+def configure(
+    templates: Sequence[str] = (),
+    failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+    cooldown: float = DEFAULT_COOLDOWN,
+    failover_timeout: Tuple[float, float] = DEFAULT_FAILOVER_TIMEOUT,
+):
+    """
+    Configures the download mirrors of the process, see MirrorList
+    """
+    global _MIRRORS
+    with _LOCK:
+        _MIRRORS = MirrorList(templates, failure_threshold, cooldown, failover_timeout)
+
+
+def get_mirrors() -> MirrorList:
+    """
+    Returns the configured mirrors. Without configuration, only the CDN is used
+    """
+    global _MIRRORS
+    with _LOCK:
+        if _MIRRORS is None:
+            _MIRRORS = MirrorList()
+        return _MIRRORS
+
+
+def close():
+    """
+    Logs the statistics of the mirrors, if any were configured, and resets them
+    """
+    global _MIRRORS
+    with _LOCK:
+        mirrors, _MIRRORS = _MIRRORS, None
+    if mirrors is not None and len(mirrors) > 1:
+        mirrors.log_stats()
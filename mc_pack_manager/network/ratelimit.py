@@ -0,0 +1,170 @@
+"""
+Rate limiting of outbound requests, shared by all threads
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import logging
+import threading
+import time
+from typing import Optional
+import urllib.parse
+
+# Local import
+from .. import utils
+
+LOGGER = utils.getLogger(__name__)
+
+# Requests per second to the metadata API
+DEFAULT_API_RATE = 10.0
+# Requests per second to the download CDN
+DEFAULT_CDN_RATE = 20.0
+
+API = "api"
+CDN = "cdn"
+
+# Domains of the Curse CDN. Downloads from other hosts, such as the server of a
+# pack's overrides or LAN mirrors, are not limited
+CDN_DOMAINS = ("forgecdn.net",)
+
+_LOCK = threading.Lock()
+_BUCKETS = {}
+
+
+class TokenBucket:
+    """
+    Token bucket: allows rate requests per second on average, and bursts of up to
+    burst requests
+
+    Callers reserve a token under a short lock and wait outside of it, so that waits
+    are served in the order tokens were reserved
+    """
+
+    def __init__(self, name: str, rate: Optional[float], burst: float = None):
+        """
+        Creates a full bucket
+
+        Arguments
+            name -- name of the bucket, for logging
+            rate -- number of tokens added per second. None or 0 disables the limit
+            burst -- maximum number of tokens in the bucket. Defaults to one second
+                worth of tokens
+        """
+        self.name = name
+        self.rate = rate or None
+        self.burst = max(1.0, burst or self.rate or 1.0)
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        # Metrics
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Takes tokens from the bucket, possibly in advance
+
+        Returns
+            The number of seconds to wait before the tokens can be used
+        """
+        with self.lock:
+            self.acquired += 1
+            if self.rate is None:
+                return 0.0
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= tokens
+            delay = max(0.0, -self.tokens / self.rate)
+            if delay:
+                self.waits += 1
+                self.wait_time += delay
+        return delay
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Blocks the current thread until tokens are available
+
+        Returns
+            The number of seconds waited
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def log_stats(self, level=logging.INFO):
+        """
+        Logs the number of requests and the time spent waiting for the bucket
+        """
+        LOGGER.log(
+            level,
+            "Rate limiter %s: %s requests, %s waited for a total of %.2fs",
+            self.name,
+            self.acquired,
+            self.waits,
+            self.wait_time,
+        )
+
+
+def configure(
+    api_rate: Optional[float] = DEFAULT_API_RATE,
+    cdn_rate: Optional[float] = DEFAULT_CDN_RATE,
+):
+    """
+    Configures the rate limits of the process
+
+    Arguments
+        api_rate -- requests per second to the metadata API. None or 0 disables it
+        cdn_rate -- downloads per second from the CDN (see CDN_DOMAINS). None or 0
+            disables it
+    """
+    with _LOCK:
+        _BUCKETS[API] = TokenBucket(API, api_rate)
+        _BUCKETS[CDN] = TokenBucket(CDN, cdn_rate)
+
+
+def get_bucket(kind: str) -> TokenBucket:
+    """
+    Returns the bucket limiting a kind of requests, API or CDN
+    """
+    with _LOCK:
+        if not _BUCKETS:
+            _BUCKETS[API] = TokenBucket(API, DEFAULT_API_RATE)
+            _BUCKETS[CDN] = TokenBucket(CDN, DEFAULT_CDN_RATE)
+        return _BUCKETS[kind]
+
+
+def download_kind(url: str) -> Optional[str]:
+    """
+    Returns the kind of requests a download counts as: CDN for the Curse CDN, None
+    for any other host, which isn't limited
+    """
+    host = (urllib.parse.urlparse(url).hostname or "").lower()
+    if any(host == domain or host.endswith("." + domain) for domain in CDN_DOMAINS):
+        return CDN
+    return None
+
+
+def acquire(kind: Optional[str]) -> float:
+    """
+    Waits until a request of the given kind is allowed, see TokenBucket.acquire().
+    Requests of kind None are not limited
+    """
+    if kind is None:
+        return 0.0
+    return get_bucket(kind).acquire()
+
+
+def close():
+    """
+    Logs the statistics of the rate limiters that were used, and resets them
+    """
+    with _LOCK:
+        for bucket in _BUCKETS.values():
+            if bucket.acquired:
+                bucket.log_stats()
+        _BUCKETS.clear()
@@ -0,0 +1,180 @@
+"""
+Retry policies and circuit breakers for web requests
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import datetime
+import email.utils
+import random
+import threading
+import time
+from typing import Optional, Tuple
+
+# Third party import
+import requests
+
+# Local import
+from .. import utils
+from ..network.common import CircuitOpenError
+
+LOGGER = utils.getLogger(__name__)
+
+# Statuses worth retrying: timeouts, rate limiting and transient server errors
+RETRYABLE_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried
+
+    Delays grow exponentially with the attempt number, up to backoff_cap, and are
+    randomized by the jitter fraction. A Retry-After header sent by the server
+    takes precedence, up to max_retry_after
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 6,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30.0,
+        jitter: float = 0.5,
+        retry_statuses=RETRYABLE_STATUSES,
+        max_retry_after: float = 120.0,
+        timeout: Tuple[float, float] = None,
+    ):
+        """
+        Creates a new retry policy
+
+        Arguments
+            max_attempts -- total number of attempts, including the first one
+            backoff_base -- delay before the first retry, in seconds
+            backoff_cap -- maximum delay between two attempts, in seconds
+            jitter -- fraction of the delay that is randomized, between 0 and 1
+            retry_statuses -- HTTP statuses that are retried. Other errors are fatal
+            max_retry_after -- maximum delay accepted from a Retry-After header
+            timeout -- (connect, read) timeout of each attempt, in seconds. None
+                uses the timeout of the session
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+
+    def is_retryable(self, status: int) -> bool:
+        """
+        Tests if a HTTP status code is worth retrying
+        """
+        return status in self.retry_statuses
+
+    def retry_after(self, response: requests.Response) -> Optional[float]:
+        """
+        Returns the delay requested by a Retry-After header, or None
+        """
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                LOGGER.debug("Ignoring invalid Retry-After header '%s'", value)
+                return None
+            delay = (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        return min(max(delay, 0.0), self.max_retry_after)
+
+    def delay(self, attempt: int, response: requests.Response = None) -> float:
+        """
+        Computes how long to wait before the next attempt
+
+        Arguments
+            attempt -- number of the attempt that just failed, starting at 1
+            response -- the failed response, if the server answered
+        """
+        if response is not None:
+            delay = self.retry_after(response)
+            if delay is not None:
+                return delay
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+    def sleep(self, delay: float):
+        """
+        Waits between two attempts
+        """
+        time.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures per host. Once failure_threshold is reached, the
+    host is considered down and requests fail fast for reset_timeout seconds. After
+    that a single trial request is let through, closing the circuit if it succeeds
+    """
+
+    def __init__(self, failure_threshold: int = 8, reset_timeout: float = 30.0):
+        """
+        Creates a new circuit breaker
+
+        Arguments
+            failure_threshold -- consecutive failures after which a host is cut off
+            reset_timeout -- seconds before a trial request is sent to a cut off host
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.opened = {}
+
+    def check(self, host: str):
+        """
+        Raises CircuitOpenError if requests to host should not be attempted
+        """
+        with self.lock:
+            opened = self.opened.get(host)
+            if opened is None:
+                return
+            retry_in = opened + self.reset_timeout - time.monotonic()
+            if retry_in > 0:
+                raise CircuitOpenError(host=host, retry_in=retry_in)
+            # Half-open: let this request through, and make others wait for it
+            LOGGER.debug("Trying failing host %s again", host)
+            self.opened[host] = time.monotonic()
+
+    def record_success(self, host: str):
+        """
+        Records a request that reached host
+        """
+        with self.lock:
+            self.failures.pop(host, None)
+            if self.opened.pop(host, None) is not None:
+                LOGGER.info("Host %s is reachable again", host)
+
+    def record_failure(self, host: str):
+        """
+        Records a failed request to host
+        """
+        with self.lock:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if self.failures[host] >= self.failure_threshold:
+                if host not in self.opened:
+                    LOGGER.warning(
+                        "%s consecutive failures for host %s, not contacting it for %ss",
+                        self.failures[host],
+                        host,
+                        self.reset_timeout,
+                    )
+                self.opened[host] = time.monotonic()
+
+    def reset(self):
+        """
+        Forgets all recorded failures
+        """
+        with self.lock:
+            self.failures.clear()
+            self.opened.clear()
@@ -0,0 +1,115 @@
+"""
+Shared HTTP session, pooling connections for the whole process
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import threading
+from typing import Tuple
+
+# Third party import
+import requests
+import requests.adapters
+
+# Local import
+from .. import utils
+
+LOGGER = utils.getLogger(__name__)
+
+# Number of hosts for which connections are kept alive
+DEFAULT_POOL_CONNECTIONS = 8
+# Number of connections kept alive per host
+DEFAULT_POOL_MAXSIZE = 16
+# Seconds to wait for a connection, and for data once connected
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+_LOCK = threading.Lock()
+_SESSION = None
+_POOL_CONNECTIONS = DEFAULT_POOL_CONNECTIONS
+_POOL_MAXSIZE = DEFAULT_POOL_MAXSIZE
+_TIMEOUT = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+
+def configure(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: float = DEFAULT_READ_TIMEOUT,
+):
+    """
+    Configures the connection pools. Closes the current session, if any
+
+    Arguments
+        pool_connections -- number of hosts to keep a connection pool for
+        pool_maxsize -- maximum number of connections kept alive per host
+        connect_timeout -- seconds to wait for a connection to a server
+        read_timeout -- seconds to wait for data from a server, between two reads
+    """
+    global _POOL_CONNECTIONS, _POOL_MAXSIZE, _TIMEOUT
+    close()
+    with _LOCK:
+        _POOL_CONNECTIONS = pool_connections
+        _POOL_MAXSIZE = pool_maxsize
+        _TIMEOUT = (connect_timeout, read_timeout)
+
+
+def get_timeout() -> Tuple[float, float]:
+    """
+    Returns the default (connect, read) timeout of the requests
+    """
+    with _LOCK:
+        return _TIMEOUT
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide session, creating it if needed. Connections are
+    kept alive and reused between requests to the same host
+    """
+    global _SESSION
+    with _LOCK:
+        if _SESSION is None:
+            LOGGER.debug(
+                "Creating HTTP session with pools for %s hosts, %s connections each",
+                _POOL_CONNECTIONS,
+                _POOL_MAXSIZE,
+            )
+            _SESSION = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=_POOL_CONNECTIONS,
+                pool_maxsize=_POOL_MAXSIZE,
+                pool_block=False,
+            )
+            _SESSION.mount("http://", adapter)
+            _SESSION.mount("https://", adapter)
+        return _SESSION
+
+
+def request(method, url, **kwargs) -> requests.Response:
+    """
+    Sends a request through the shared session. Same arguments as requests.request(),
+    the timeout defaulting to the configured one
+    """
+    kwargs.setdefault("timeout", get_timeout())
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared session. Same arguments as requests.get(),
+    the timeout defaulting to the configured one
+    """
+    kwargs.setdefault("timeout", get_timeout())
+    return get_session().get(url, **kwargs)
+
+
+def close():
+    """
+    Closes the shared session and all its connections
+    """
+    global _SESSION
+    with _LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
@@ -0,0 +1,519 @@
+"""
+Twitch (CurseForge) API client
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard lib import
+import json
+import threading
+import time
+import urllib.parse
+
+# Third party import
+import requests
+
+# Local import
+from .. import utils
+from ..network import metrics
+from ..network import ratelimit
+from ..network import session
+from ..network.common import RequestFailedError
+from ..network.retry import CircuitBreaker, RetryPolicy
+
+LOGGER = utils.getLogger(__name__)
+
+
+class TwitchAPI:
+    """
+    Class for connecting to the Twitch (CurseForge) API and caching results. See
+    https://twitchappapi.docs.apiary.io/
+    """
+
+    ROOT = r"https://addons-ecs.forgesvc.net/api/v2"
+    #ROOT= r"https://private-anon-d0ed3247cf-twitchappapi.apiary-proxy.com/api/v2/"
+    HEADERS = {
+        "User-Agent": r"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.157 Safari/537.36"
+    }
+    MOD_CACHE = {}
+    FILE_CACHE = {}
+    URL_CACHE = {}
+    # Download url -> (addonID, fileID), the reverse of URL_CACHE
+    URL_IDS = {}
+    # Guards the caches above, lookups may be run from several worker threads
+    CACHE_LOCK = threading.RLock()
+    # Persistent network.cache.MetadataCache backing the caches above, if any
+    STORE = None
+    RETRY_POLICY = RetryPolicy()
+    CIRCUIT_BREAKER = CircuitBreaker()
+    # Maximum number of IDs sent in a single batch request
+    BATCH_SIZE = 100
+    # hashlib names of the "algo" values found in the "hashes" of a file info
+    HASH_ALGORITHMS = {1: "sha1", 2: "md5"}
+
+    @classmethod
+    def get(cls, *args, **kwargs):
+        return cls.urlget(*args, headers=cls.HEADERS, **kwargs)
+
+    @classmethod
+    def post(cls, *args, **kwargs):
+        return cls.urlrequest("POST", *args, headers=cls.HEADERS, **kwargs)
+
+    @classmethod
+    def _cached_addon(cls, addonID):
+        """
+        Returns the addon info from the memory or persistent caches, or None
+        """
+        with cls.CACHE_LOCK:
+            info = cls.MOD_CACHE.get(addonID)
+        if info is not None:
+            LOGGER.debug("Using cached info for addon %s", addonID)
+        elif cls.STORE is not None:
+            info = cls.STORE.get_addon(addonID)
+            if info is not None:
+                LOGGER.debug("Using stored info for addon %s", addonID)
+                with cls.CACHE_LOCK:
+                    info = cls.MOD_CACHE.setdefault(addonID, info)
+        metrics.record_cache("addon", info is not None)
+        return info
+
+    @classmethod
+    def _cache_addon(cls, addonID, info):
+        """
+        Saves an addon info in the caches, returns the cached info
+        """
+        if cls.STORE is not None:
+            cls.STORE.put_addon(addonID, info)
+        with cls.CACHE_LOCK:
+            return cls.MOD_CACHE.setdefault(addonID, info)
+
+    @classmethod
+    def _cached_file(cls, addonID, fileID):
+        """
+        Returns the file info from the memory or persistent caches, or None
+        """
+        key = "%s/%s" % (addonID, fileID)
+        with cls.CACHE_LOCK:
+            info = cls.FILE_CACHE.get(key)
+        if info is not None:
+            LOGGER.debug("Using cached info for file %s", key)
+        elif cls.STORE is not None:
+            info = cls.STORE.get_file(addonID, fileID)
+            if info is not None:
+                LOGGER.debug("Using stored info for file %s", key)
+                with cls.CACHE_LOCK:
+                    info = cls.FILE_CACHE.setdefault(key, info)
+        metrics.record_cache("file", info is not None)
+        return info
+
+    @classmethod
+    def _cache_file(cls, addonID, fileID, info):
+        """
+        Saves a file info in the caches, returns the cached info
+        """
+        if cls.STORE is not None:
+            cls.STORE.put_file(addonID, fileID, info)
+        key = "%s/%s" % (addonID, fileID)
+        with cls.CACHE_LOCK:
+            if info.get("downloadUrl"):
+                cls._remember_url(addonID, fileID, info["downloadUrl"])
+            return cls.FILE_CACHE.setdefault(key, info)
+
+    @classmethod
+    def _cached_url(cls, addonID, fileID):
+        """
+        Returns the download url of a file from the memory or persistent caches, or
+        None. Cheaper lookups are tried first: memory, then the stored url, then the
+        stored file info
+        """
+        key = "%s/%s" % (addonID, fileID)
+        with cls.CACHE_LOCK:
+            url = cls.URL_CACHE.get(key)
+        if url is not None:
+            LOGGER.debug("Using cached download url for file %s", key)
+        elif cls.STORE is not None:
+            url = cls.STORE.get_url(addonID, fileID)
+            if url is not None:
+                LOGGER.debug("Using stored download url for file %s", key)
+                with cls.CACHE_LOCK:
+                    url = cls._remember_url(addonID, fileID, url)
+        if url is None:
+            info = cls._cached_file(addonID, fileID)
+            if info is not None and info.get("downloadUrl"):
+                url = cls._cache_url(addonID, fileID, info["downloadUrl"])
+        metrics.record_cache("url", url is not None)
+        return url
+
+    @classmethod
+    def _cache_url(cls, addonID, fileID, url):
+        """
+        Saves a download url in the caches, returns the cached url
+        """
+        if cls.STORE is not None:
+            cls.STORE.put_url(addonID, fileID, url)
+        with cls.CACHE_LOCK:
+            return cls._remember_url(addonID, fileID, url)
+
+    @classmethod
+    def _remember_url(cls, addonID, fileID, url):
+        """
+        Saves a download url in URL_CACHE and URL_IDS, returns the cached url. Must
+        be called with CACHE_LOCK held
+        """
+        url = cls.URL_CACHE.setdefault("%s/%s" % (addonID, fileID), url)
+        cls.URL_IDS.setdefault(url, (int(addonID), int(fileID)))
+        return url
+
+    @classmethod
+    def get_file_ids(cls, url):
+        """
+        Returns the (addonID, fileID) of a cached download url, or None
+        """
+        with cls.CACHE_LOCK:
+            return cls.URL_IDS.get(url)
+
+    @classmethod
+    def get_addon_info(cls, addonID):
+        """
+        Get a Twitch addon info as a JSON file
+
+        Args:
+            addonID : the ID of the addon, as found in manifest files
+        
+        Returns:
+            A json object (as built by the `json` module) containing the info for the addon
+
+        Raises:
+            RequestFailedError -- if the info couldn't be retrieved
+        """
+        info = cls._cached_addon(addonID)
+        if info is not None:
+            return info
+        LOGGER.debug("Downloading info for addon %s", addonID)
+        info = cls.get_json(f"{cls.ROOT}/addon/{addonID}")
+        return cls._cache_addon(addonID, info)
+
+    @classmethod
+    def get_json(cls, url):
+        """
+        Requests an API url and decodes its JSON answer. Answers that fail to decode
+        are requested once more, in case of a network problem
+
+        Raises
+            RequestFailedError -- if the server didn't answer with a success
+        """
+        for attempt in (1, 2):
+            req = cls.get(url)
+            if not req.ok:
+                raise RequestFailedError(
+                    url=url,
+                    reason="HTTP status %s" % req.status_code,
+                    status=req.status_code,
+                )
+            try:
+                return json.loads(req.content)
+            except json.JSONDecodeError as err:
+                if attempt == 2:
+                    raise
+                LOGGER.warn(
+                    "Decoding received JSON failed, trying again in case of network problem"
+                )
+                LOGGER.debug(
+                    "While requesting %s, encountered: %s", url, utils.err_str(err)
+                )
+
+    @classmethod
+    def get_file_info(cls, addonID, fileID):
+        """
+        Get a Twitch addon specific file information, as JSON
+
+        Raises
+            RequestFailedError -- if the info couldn't be retrieved
+        """
+        info = cls._cached_file(addonID, fileID)
+        if info is not None:
+            return info
+        LOGGER.debug("Downloding file info for file %s/%s", addonID, fileID)
+        info = cls.get_json(f"{cls.ROOT}/addon/{addonID}/file/{fileID}")
+        return cls._cache_file(addonID, fileID, info)
+
+    @classmethod
+    def _batches(cls, items):
+        items = list(items)
+        for i in range(0, len(items), cls.BATCH_SIZE):
+            yield items[i : i + cls.BATCH_SIZE]
+
+    @classmethod
+    def get_addons_info(cls, addonIDs, jobs: int = 1):
+        """
+        Get the info of several addons, using as few requests as possible
+
+        Uncached addons are requested in batches of BATCH_SIZE from the API
+        multi-addon endpoint. Addons a batch didn't provide are requested one by one
+
+        Arguments
+            addonIDs -- iterable of addon IDs
+            jobs -- number of concurrent requests to use
+
+        Returns
+            A dict mapping each addon ID to its info
+        """
+        result = {}
+        missing = []
+        for addonID in dict.fromkeys(addonIDs):
+            info = cls._cached_addon(addonID)
+            if info is None:
+                missing.append(addonID)
+            else:
+                result[addonID] = info
+        for batch, infos in zip(
+            list(cls._batches(missing)),
+            utils.thread_map(cls._post_addons, cls._batches(missing), jobs),
+        ):
+            by_id = {info.get("id"): info for info in infos}
+            for addonID in batch:
+                if addonID in by_id:
+                    result[addonID] = cls._cache_addon(addonID, by_id[addonID])
+        missing = [addonID for addonID in missing if addonID not in result]
+        if missing:
+            LOGGER.debug("Resolving %s addons one by one", len(missing))
+        result.update(
+            zip(missing, utils.thread_map(cls.get_addon_info, missing, jobs))
+        )
+        return result
+
+    @classmethod
+    def _post_addons(cls, addonIDs):
+        """
+        Requests a batch of addons, returns a list of addon info (possibly empty)
+        """
+        LOGGER.debug("Downloading info for %s addons", len(addonIDs))
+        try:
+            req = cls.post(f"{cls.ROOT}/addon", json=list(addonIDs))
+            infos = json.loads(req.content) if req.ok else None
+            if isinstance(infos, list):
+                return infos
+        except Exception as err:
+            LOGGER.debug("Batch addon request failed: %s", utils.err_str(err))
+        LOGGER.warning("Couldn't get addons in a batch, falling back to single requests")
+        return []
+
+    @classmethod
+    def get_files_info(cls, files, jobs: int = 1):
+        """
+        Get the info of several files, using as few requests as possible
+
+        Uncached files are requested in batches of BATCH_SIZE from the API
+        multi-file endpoint. Files a batch didn't provide are requested one by one
+
+        Arguments
+            files -- iterable of (addonID, fileID) pairs
+            jobs -- number of concurrent requests to use
+
+        Returns
+            A dict mapping each (addonID, fileID) pair to the file info
+        """
+        result = {}
+        missing = []
+        for addonID, fileID in dict.fromkeys(tuple(pair) for pair in files):
+            info = cls._cached_file(addonID, fileID)
+            if info is None:
+                missing.append((addonID, fileID))
+            else:
+                result[(addonID, fileID)] = info
+        for batch, infos in zip(
+            list(cls._batches(missing)),
+            utils.thread_map(cls._post_files, cls._batches(missing), jobs),
+        ):
+            for addonID, fileID in batch:
+                if fileID in infos:
+                    result[(addonID, fileID)] = cls._cache_file(
+                        addonID, fileID, infos[fileID]
+                    )
+        missing = [pair for pair in missing if pair not in result]
+        if missing:
+            LOGGER.debug("Resolving %s files one by one", len(missing))
+        result.update(
+            zip(missing, utils.thread_map(cls.get_file_info, missing, jobs, star=True))
+        )
+        return result
+
+    @classmethod
+    def _post_files(cls, files):
+        """
+        Requests a batch of files, returns a dict mapping fileIDs to file info
+        """
+        LOGGER.debug("Downloading info for %s files", len(files))
+        try:
+            req = cls.post(
+                f"{cls.ROOT}/addon/files", json=[fileID for _, fileID in files]
+            )
+            if req.ok:
+                # The answer maps each fileID (as a string) to a list of files
+                return {
+                    info["id"]: info
+                    for infos in json.loads(req.content).values()
+                    for info in infos
+                }
+        except Exception as err:
+            LOGGER.debug("Batch file request failed: %s", utils.err_str(err))
+        LOGGER.warning("Couldn't get files in a batch, falling back to single requests")
+        return {}
+
+    @classmethod
+    def get_download_url(cls, addonID, fileID):
+        """
+        Get a Twitch addon download url
+
+        Raises
+            RequestFailedError -- if the url couldn't be retrieved
+        """
+        url = cls._cached_url(addonID, fileID)
+        if url is not None:
+            return url
+        LOGGER.debug("Retrieving download url for %s/%s", addonID, fileID)
+        endpoint = f"{cls.ROOT}/addon/{addonID}/file/{fileID}/download-url"
+        req = cls.get(endpoint)
+        if not req.ok:
+            raise RequestFailedError(
+                url=endpoint, reason="HTTP status %s" % req.status_code
+            )
+        return cls._cache_url(addonID, fileID, req.text.strip())
+
+    @classmethod
+    def get_download_urls(cls, files, jobs: int = 1):
+        """
+        Get the download urls of several files, using as few requests as possible
+
+        Uncached urls are taken from the file infos, which are requested in batches
+        (see get_files_info()). This also fills the file info caches
+
+        Arguments
+            files -- iterable of (addonID, fileID) pairs
+            jobs -- number of concurrent requests to use
+
+        Returns
+            A dict mapping each (addonID, fileID) pair to its download url
+        """
+        result = {}
+        missing = []
+        for addonID, fileID in dict.fromkeys(tuple(pair) for pair in files):
+            url = cls._cached_url(addonID, fileID)
+            if url is None:
+                missing.append((addonID, fileID))
+            else:
+                result[(addonID, fileID)] = url
+        if missing:
+            LOGGER.debug("Resolving download urls of %s files", len(missing))
+        cls.get_files_info(missing, jobs)
+        result.update(
+            zip(
+                missing,
+                utils.thread_map(cls.get_download_url, missing, jobs, star=True),
+            )
+        )
+        return result
+
+    @classmethod
+    def get_file_checksum(cls, addonID, fileID):
+        """
+        Get what is needed to verify the download of a Twitch addon file
+
+        Returns
+            A (checksum, size) tuple. checksum is "<algorithm>:<hex digest>", as
+            expected by network.download_file(), or None if the API provides no
+            usable hash. size is the file length in bytes, or None if unknown
+        """
+        info = cls.get_file_info(addonID, fileID)
+        size = info.get("fileLength") or None
+        for hsh in info.get("hashes") or ():
+            algorithm = cls.HASH_ALGORITHMS.get(hsh.get("algo"))
+            if algorithm is not None and hsh.get("value"):
+                return "%s:%s" % (algorithm, hsh["value"].lower()), size
+        return None, size
+
+    @classmethod
+    def urlget(cls, url, **kwargs):
+        return cls.urlrequest("GET", url, **kwargs)
+
+    @classmethod
+    def urlrequest(cls, method, url, **kwargs):
+        """
+        Sends a request, retrying transient failures as per cls.RETRY_POLICY. Each
+        attempt counts against the API rate limit. The request is recorded in the
+        network metrics
+
+        Arguments
+            method -- HTTP method to use
+            url -- url to request
+            kwargs -- passed to requests
+
+        Returns
+            The last response received. It is not ok if the server answered with a
+            non-retryable error status, or still failed after the last attempt
+
+        Raises
+            CircuitOpenError -- if the host failed too often recently
+            RequestFailedError -- if the host could not be reached at all
+        """
+        policy = cls.RETRY_POLICY
+        host = urllib.parse.urlparse(url).netloc
+        attempt = 0
+        req = None
+        start = time.monotonic()
+        waited = 0.0
+        try:
+            while True:
+                attempt += 1
+                cls.CIRCUIT_BREAKER.check(host)
+                waited += ratelimit.acquire(ratelimit.API)
+                try:
+                    req = session.request(method, url, **kwargs)
+                except requests.RequestException as err:
+                    cls.CIRCUIT_BREAKER.record_failure(host)
+                    LOGGER.debug(
+                        "A web request raised on trial %s: %s", attempt, utils.err_str(err)
+                    )
+                    if attempt >= policy.max_attempts:
+                        LOGGER.fatal(
+                            "A web request failed %s times, check your network and the server",
+                            attempt,
+                        )
+                        raise RequestFailedError(url=url, reason=utils.err_str(err))
+                    delay = policy.delay(attempt)
+                else:
+                    if req.ok:
+                        cls.CIRCUIT_BREAKER.record_success(host)
+                        return req
+                    LOGGER.debug("Got HTTP status %s on trial %s", req.status_code, attempt)
+                    LOGGER.debug(
+                        "HTTP Headers were:\n%s", json.dumps(dict(req.headers), indent=4)
+                    )
+                    if not policy.is_retryable(req.status_code):
+                        # The server is fine, the request isn't
+                        cls.CIRCUIT_BREAKER.record_success(host)
+                        LOGGER.error(
+                            "Web request to %s failed with HTTP status %s",
+                            url,
+                            req.status_code,
+                        )
+                        return req
+                    cls.CIRCUIT_BREAKER.record_failure(host)
+                    if attempt >= policy.max_attempts:
+                        LOGGER.fatal(
+                            "A web request failed %s times, check your network and the server",
+                            attempt,
+                        )
+                        return req
+                    delay = policy.delay(attempt, req)
+                LOGGER.debug("Retrying in %.2fs", delay)
+                policy.sleep(delay)
+        finally:
+            metrics.record_request(
+                url,
+                "api",
+                time.monotonic() - start - waited,
+                size=len(req.content) if req is not None else 0,
+                retries=max(0, attempt - 1),
+                ok=req is not None and req.ok,
+                by_endpoint=True,
+            )
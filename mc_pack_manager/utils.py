@@ -6,6 +6,7 @@ Miscellaneous utilities
 # Standard lib import
 from collections import namedtuple
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 import enum
 from functools import wraps
 import hashlib
@@ -14,7 +15,7 @@ import json
 import logging
 from pathlib import Path
 from traceback import format_exception_only, format_tb
-from typing import TypeVar, Mapping, Iterable, Union, List
+from typing import Callable, TypeVar, Mapping, Iterable, Union, List
 
 LOGGER = logging.getLogger("mpm.utils")
 
@@ -281,6 +282,59 @@ def file_hash(filepath: Path):
     return hsh.hexdigest()
 
 
+def thread_map(
+    function: Callable, iterable: Iterable, jobs: int = 1, star: bool = False
+) -> list:
+    """
+    Calls function on each element of iterable, using up to jobs threads
+
+    Arguments
+        function -- the function to call
+        iterable -- elements to call the function on
+        jobs -- maximum number of worker threads to use
+        star -- elements are tuples of arguments to unpack in the call
+
+    Returns
+        A list of the results, in the order of iterable
+    """
+    items = list(iterable)
+    call = (lambda args: function(*args)) if star else function
+    if jobs <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+        return list(executor.map(call, items))
+
+
+SIZE_UNITS = ("B", "KiB", "MiB", "GiB", "TiB")
+
+
+def format_size(size: int) -> str:
+    """
+    Formats a number of bytes for display, e.g. "1.5 MiB"
+    """
+    size = float(size)
+    for unit in SIZE_UNITS[:-1]:
+        if abs(size) < 1024:
+            break
+        size /= 1024
+    else:
+        unit = SIZE_UNITS[-1]
+    return ("%d %s" if unit == "B" else "%.1f %s") % (size, unit)
+
+
+def parse_size(string: str) -> int:
+    """
+    Parses a size such as "512", "200M" or "4G" into a number of bytes.
+    Suffixes are powers of 1024
+    """
+    string = str(string).strip().upper().rstrip("IB")
+    factor = 1
+    if string and string[-1] in "KMGT":
+        factor = 1024 ** ("KMGT".index(string[-1]) + 1)
+        string = string[:-1]
+    return int(float(string) * factor)
+
+
 def err_str(err):
     """
     Utility function to get a nice str of an Exception for display purposes
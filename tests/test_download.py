@@ -0,0 +1,135 @@
+"""
+Tests of the streaming downloads
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import io
+from pathlib import PurePath
+import socket
+import time
+import unittest
+
+# Local import
+from mc_pack_manager import network
+from mc_pack_manager.filesystem.ftp import StorStream
+from mc_pack_manager.network import mirrors
+from mc_pack_manager.network.fakeserver import FakeCurseServer, Fixtures
+
+
+class _DataConnection:
+    """
+    Data connection of _FakeFTP, keeping what is sent
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def sendall(self, data: bytes):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeFTP:
+    """
+    Just enough of ftplib.FTP to back a StorStream
+    """
+
+    def __init__(self):
+        self.transfers = []
+
+    def voidcmd(self, cmd: str):
+        return "200 OK"
+
+    def voidresp(self):
+        return "226 Transfer complete"
+
+    def transfercmd(self, cmd: str):
+        self.transfers.append(_DataConnection())
+        return self.transfers[-1]
+
+
+class MirrorFailoverTest(unittest.TestCase):
+    def setUp(self):
+        self.fixtures = Fixtures(count=1, jar_size=512 * 1024)
+        self.fileID = next(iter(self.fixtures.files))
+        self.addonID = self.fixtures.files[self.fileID]["addonID"]
+
+    def tearDown(self):
+        mirrors.close()
+        with network.TwitchAPI.CACHE_LOCK:
+            network.TwitchAPI.URL_CACHE.clear()
+            network.TwitchAPI.URL_IDS.clear()
+
+    def test_failover_into_stor_stream(self):
+        with FakeCurseServer(self.fixtures, drop_rate=1.0) as broken, FakeCurseServer(
+            self.fixtures
+        ) as origin:
+            url = self.fixtures.download_url(self.fileID, origin.cdn_root)
+            network.TwitchAPI._cache_url(self.addonID, self.fileID, url)
+            mirrors.configure([broken.cdn_root.rsplit("/", 1)[0] + "/{path}"])
+            ftp = _FakeFTP()
+            stream = StorStream(ftp, PurePath("mods/fake.jar"))
+            checksum = "sha1:" + self.fixtures.sha1(self.fileID)
+            jar = self.fixtures.jar(self.fileID)
+            size = network.download_to(url, stream, checksum=checksum, size=len(jar))
+            stream.finish()
+        self.assertEqual(size, len(jar))
+        self.assertGreater(broken.requests.get("get_jar", 0), 0)
+        # The partial upload from the broken mirror was aborted and started over
+        self.assertGreater(len(ftp.transfers), 1)
+        self.assertTrue(all(conn.closed for conn in ftp.transfers))
+        self.assertEqual(bytes(ftp.transfers[-1].data), jar)
+
+    def test_failover_from_unresponsive_mirror(self):
+        # Accepts connections but never answers
+        silent = socket.socket()
+        silent.bind(("127.0.0.1", 0))
+        silent.listen(16)
+        try:
+            with FakeCurseServer(self.fixtures) as origin:
+                url = self.fixtures.download_url(self.fileID, origin.cdn_root)
+                network.TwitchAPI._cache_url(self.addonID, self.fileID, url)
+                mirrors.configure(
+                    ["http://127.0.0.1:%s/{path}" % silent.getsockname()[1]],
+                    failover_timeout=(0.5, 0.5),
+                )
+                jar = self.fixtures.jar(self.fileID)
+                data = io.BytesIO()
+                started = time.monotonic()
+                size = network.download_to(url, data, size=len(jar))
+                elapsed = time.monotonic() - started
+        finally:
+            silent.close()
+        self.assertEqual(size, len(jar))
+        self.assertEqual(data.getvalue(), jar)
+        self.assertLess(elapsed, 10)
+        self.assertEqual(mirrors.get_mirrors().mirrors[0].errors, 1)
+
+
+class MirrorCandidatesTest(unittest.TestCase):
+    def tearDown(self):
+        with network.TwitchAPI.CACHE_LOCK:
+            network.TwitchAPI.URL_CACHE.clear()
+            network.TwitchAPI.URL_IDS.clear()
+
+    def test_only_mod_downloads_are_mirrored(self):
+        mirror_list = mirrors.MirrorList(["http://lan/{addonID}/{fileID}/{filename}"])
+        url = "https://edge.forgecdn.net/files/1/2/mod.jar"
+        override = "https://example.com/pack/overrides/config/mod.cfg"
+        network.TwitchAPI._cache_url(10, 20, url)
+        self.assertEqual(
+            [mirror_url for _, mirror_url in mirror_list.candidates(url)],
+            ["http://lan/10/20/mod.jar", url],
+        )
+        self.assertEqual(
+            [mirror_url for _, mirror_url in mirror_list.candidates(override)],
+            [override],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,488 @@
+"""
+Tests of the FTP filesystem, against an in-memory FTP server
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import ftplib
+import hashlib
+import json
+from pathlib import Path, PurePath
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Local import
+from mc_pack_manager.filesystem import ftp
+from mc_pack_manager.filesystem.ftp import FTPConnectionPool, FTPFileSystem
+
+
+def _posix(path) -> str:
+    return PurePath(path).as_posix()
+
+
+class _MemoryServer:
+    """
+    Content of an in-memory FTP server, shared by its _MemoryFTP connections
+    """
+
+    def __init__(self, features=()):
+        self.lock = threading.Lock()
+        # Posix path -> content
+        self.files = {}
+        self.dirs = {"."}
+        self.features = list(features)
+        self.commands = []
+        # Number of bytes after which uploads break, None for working uploads
+        self.break_after = None
+        # Number of uploads left to break, None to break them all
+        self.breaks = None
+
+    def connect(self) -> "_MemoryFTP":
+        return _MemoryFTP(self)
+
+
+class _MemoryFTP:
+    """
+    The part of ftplib.FTP used by FTPFileSystem, backed by a _MemoryServer
+    """
+
+    def __init__(self, server: _MemoryServer):
+        self.server = server
+
+    def _command(self, cmd: str):
+        with self.server.lock:
+            self.server.commands.append(cmd)
+
+    def sendcmd(self, cmd: str) -> str:
+        self._command(cmd)
+        verb, _, arg = cmd.partition(" ")
+        if verb == "FEAT":
+            return "\n".join(["211-Features:", *self.server.features, "211 End"])
+        if verb == "XSHA256" and "XSHA256" in self.server.features:
+            content = self.server.files.get(_posix(arg))
+            if content is None:
+                raise ftplib.error_perm("550 No such file or directory")
+            return "213 " + hashlib.sha256(content).hexdigest()
+        raise ftplib.error_perm("500 Unknown command")
+
+    def voidcmd(self, cmd: str) -> str:
+        self._command(cmd)
+        return "200 OK"
+
+    def mlsd(self, path: str = "", facts=()):
+        self._command("MLSD %s" % path)
+        directory = _posix(path or ".")
+        if directory not in self.server.dirs:
+            raise ftplib.error_perm("550 No such file or directory")
+        entries = []
+        for name in sorted(self.server.dirs):
+            if name != "." and _posix(PurePath(name).parent) == directory:
+                entries.append((PurePath(name).name, {"type": "dir"}))
+        for name, content in sorted(self.server.files.items()):
+            if _posix(PurePath(name).parent) == directory:
+                entries.append(
+                    (PurePath(name).name, {"type": "file", "size": str(len(content))})
+                )
+        return iter(entries)
+
+    def size(self, path: str) -> int:
+        self._command("SIZE %s" % path)
+        content = self.server.files.get(_posix(path))
+        if content is None:
+            raise ftplib.error_perm("550 No such file or directory")
+        return len(content)
+
+    def delete(self, path: str):
+        self._command("DELE %s" % path)
+        if self.server.files.pop(_posix(path), None) is None:
+            raise ftplib.error_perm("550 No such file or directory")
+
+    def rename(self, src: str, dest: str):
+        self._command("RNFR %s" % src)
+        content = self.server.files.pop(_posix(src), None)
+        if content is None:
+            raise ftplib.error_perm("550 No such file or directory")
+        self.server.files[_posix(dest)] = content
+
+    def mkd(self, path: str):
+        self._command("MKD %s" % path)
+        path = _posix(path)
+        if path in self.server.dirs or path in self.server.files:
+            raise ftplib.error_perm("550 File exists")
+        self.server.dirs.add(path)
+
+    def storbinary(self, cmd, fp, blocksize=8192, callback=None, rest=None):
+        self._command(cmd if rest is None else "REST %s, %s" % (rest, cmd))
+        verb, _, path = cmd.partition(" ")
+        path = _posix(path)
+        if _posix(PurePath(path).parent) not in self.server.dirs:
+            raise ftplib.error_perm("553 No such directory")
+        if verb == "APPE":
+            content = self.server.files.setdefault(path, bytearray())
+        elif rest:
+            content = self.server.files.setdefault(path, bytearray())
+            del content[rest:]
+        else:
+            content = self.server.files[path] = bytearray()
+        received = 0
+        for block in iter(lambda: fp.read(blocksize), b""):
+            limit = self.server.break_after
+            if limit is not None and received + len(block) > limit:
+                content += block[: max(0, limit - received)]
+                if self.server.breaks is not None:
+                    self.server.breaks -= 1
+                    if not self.server.breaks:
+                        self.server.break_after = None
+                raise ConnectionResetError("Connection reset by peer")
+            content += block
+            received += len(block)
+            if callback is not None:
+                callback(block)
+        return "226 Transfer complete"
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        self._command(cmd)
+        content = self.server.files.get(_posix(cmd.partition(" ")[2]))
+        if content is None:
+            raise ftplib.error_perm("550 No such file or directory")
+        callback(bytes(content))
+        return "226 Transfer complete"
+
+    def nlst(self, path: str = ""):
+        return [name for name, _ in self.mlsd(path)]
+
+    def pwd(self) -> str:
+        return "/"
+
+    def cwd(self, path: str):
+        return "250 OK"
+
+    def quit(self):
+        return "221 Bye"
+
+    def close(self):
+        pass
+
+
+class FTPTestCase(unittest.TestCase):
+    """
+    Runs each test with a FTPFileSystem connected to a fresh _MemoryServer
+    """
+
+    features = ()
+
+    def setUp(self):
+        self.server = _MemoryServer(self.features)
+        patcher = mock.patch.object(
+            FTPConnectionPool, "connect", lambda pool: self.server.connect()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.local = tempfile.TemporaryDirectory()
+        self.addCleanup(self.local.cleanup)
+        self.fs = self.open_fs()
+
+    def open_fs(self) -> FTPFileSystem:
+        """
+        Opens a new filesystem on the server, as a new run of mpm would
+        """
+        fs = FTPFileSystem("localhost", "user", "passwd")
+        self.addCleanup(fs.close)
+        return fs
+
+    def stored(self, path: str) -> list:
+        """
+        Returns the upload commands sent for a path
+        """
+        return [
+            cmd
+            for cmd in self.server.commands
+            if cmd.endswith(("STOR " + path, "APPE " + path))
+        ]
+
+    def local_file(self, name: str, content: bytes) -> Path:
+        path = Path(self.local.name) / name
+        path.write_bytes(content)
+        return path
+
+
+class RemoteIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _MemoryServer()
+        self.server.dirs.update({"mods", "config", "config/sub"})
+        self.server.files.update(
+            {
+                "mods/a.jar": bytearray(b"a"),
+                "config/a.cfg": bytearray(b"cfg"),
+                "config/sub/b.cfg": bytearray(b"b"),
+            }
+        )
+        self.ftp = self.server.connect()
+        self.index = ftp.RemoteIndex()
+
+    def listings(self):
+        return [cmd for cmd in self.server.commands if cmd.startswith("MLSD")]
+
+    def test_stat_lists_each_directory_once(self):
+        self.assertEqual(
+            self.index.stat(self.ftp, PurePath("config/a.cfg")),
+            {"type": "file", "size": "3"},
+        )
+        self.assertIsNone(self.index.stat(self.ftp, PurePath("config/missing.cfg")))
+        self.assertEqual(
+            self.index.stat(self.ftp, PurePath("config/sub"))["type"], "dir"
+        )
+        self.assertEqual(self.listings(), ["MLSD .", "MLSD config"])
+
+    def test_index_tree(self):
+        self.index.index_tree(self.ftp, PurePath("."))
+        self.assertEqual(len(self.listings()), 4)
+        # Indexing again lists nothing, and lookups are answered from memory
+        self.index.index_tree(self.ftp, PurePath("."))
+        self.assertIsNotNone(self.index.stat(self.ftp, PurePath("config/sub/b.cfg")))
+        self.assertIsNone(self.index.stat(self.ftp, PurePath("mods/b.jar")))
+        self.assertEqual(len(self.listings()), 4)
+
+    def test_move_directory(self):
+        self.index.index_tree(self.ftp, PurePath("."))
+        self.index.move(PurePath("config"), PurePath("old-config"))
+        self.assertIsNone(self.index.stat(self.ftp, PurePath("config")))
+        self.assertEqual(
+            self.index.stat(self.ftp, PurePath("old-config"))["type"], "dir"
+        )
+        self.assertEqual(
+            self.index.stat(self.ftp, PurePath("old-config/sub/b.cfg"))["size"], "1"
+        )
+        self.assertIsNone(self.index.stat(self.ftp, PurePath("old-config/sub/c.cfg")))
+        self.assertEqual(len(self.listings()), 4)
+
+    def test_move_unknown_source(self):
+        self.index.stat(self.ftp, PurePath("mods/a.jar"))
+        self.server.files["mods/b.jar"] = self.server.files.pop("mods/a.jar")
+        self.index.move(PurePath("mods/unknown.jar"), PurePath("mods/b.jar"))
+        # The parent of dest is listed again rather than reporting it missing
+        self.assertIsNotNone(self.index.stat(self.ftp, PurePath("mods/b.jar")))
+
+    def test_remove(self):
+        self.index.index_tree(self.ftp, PurePath("."))
+        self.index.remove(PurePath("config"))
+        self.assertIsNone(self.index.stat(self.ftp, PurePath("config")))
+        self.assertIsNone(self.index.stat(self.ftp, PurePath("config/sub/b.cfg")))
+        self.assertNotIn(PurePath("config"), self.index.below)
+
+
+class SendFileTest(FTPTestCase):
+    def test_failed_small_upload_keeps_dest(self):
+        self.server.dirs.add("config")
+        self.server.files["config/mod.cfg"] = bytearray(b"old content")
+        src = self.local_file("mod.cfg", b"new content")
+        self.server.break_after = 4
+        with self.assertRaises(OSError):
+            self.fs.send_file(src, "config/mod.cfg", force=True)
+        self.assertEqual(self.server.files["config/mod.cfg"], b"old content")
+        self.server.break_after = None
+        self.fs.send_file(src, "config/mod.cfg", force=True)
+        self.assertEqual(self.server.files["config/mod.cfg"], b"new content")
+        self.assertNotIn("config/mod.cfg.part", self.server.files)
+
+    def test_new_small_file_is_uploaded_in_place(self):
+        src = self.local_file("mod.cfg", b"content")
+        self.fs.send_file(src, "config/mod.cfg")
+        self.assertEqual(self.server.files["config/mod.cfg"], b"content")
+        self.assertNotIn("RNFR config/mod.cfg.part", self.server.commands)
+
+
+class HashRecordsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _MemoryServer()
+        self.ftp = self.server.connect()
+        self.records = ftp.HashRecords(PurePath(ftp.HASH_RECORD_FILE))
+
+    def stors(self):
+        return [cmd for cmd in self.server.commands if cmd.startswith("STOR")]
+
+    def test_missing_sidecar(self):
+        self.assertIsNone(self.records.get(self.ftp, "mods/a.jar"))
+        self.assertFalse(self.records.save(self.ftp))
+        self.assertNotIn(ftp.HASH_RECORD_FILE, self.server.files)
+
+    def test_corrupted_sidecar_is_ignored(self):
+        self.server.files[ftp.HASH_RECORD_FILE] = bytearray(b"{not json")
+        self.assertIsNone(self.records.get(self.ftp, "mods/a.jar"))
+
+    def test_saved_once_when_changed(self):
+        self.records.put(self.ftp, "mods/a.jar", 1, {"sha256": "aa"})
+        self.records.put(self.ftp, "mods/b.jar", 2, {"sha256": "bb"})
+        self.assertNotIn(ftp.HASH_RECORD_FILE, self.server.files)
+        self.assertTrue(self.records.save(self.ftp))
+        self.assertFalse(self.records.save(self.ftp))
+        self.assertEqual(len(self.stors()), 1)
+        saved = json.loads(self.server.files[ftp.HASH_RECORD_FILE].decode("utf-8"))
+        self.assertEqual(saved["mods/b.jar"], {"size": 2, "hashes": {"sha256": "bb"}})
+        # A new session reads them back
+        records = ftp.HashRecords(PurePath(ftp.HASH_RECORD_FILE))
+        self.assertEqual(records.get(self.ftp, "mods/a.jar")["size"], 1)
+
+    def test_remove_directory(self):
+        self.records.put(self.ftp, "config/a.cfg", 1, {})
+        self.records.put(self.ftp, "config/sub/b.cfg", 1, {})
+        self.records.put(self.ftp, "configs.txt", 1, {})
+        self.records.remove("config")
+        self.assertIsNone(self.records.get(self.ftp, "config/a.cfg"))
+        self.assertIsNone(self.records.get(self.ftp, "config/sub/b.cfg"))
+        self.assertIsNotNone(self.records.get(self.ftp, "configs.txt"))
+        self.assertNotIn("config", self.records.below)
+
+    def test_move(self):
+        self.records.put(self.ftp, "mods/a.jar.part", 1, {"sha256": "aa"})
+        self.records.put(self.ftp, "mods/a.jar", 2, {"sha256": "old"})
+        self.records.move("mods/a.jar.part", "mods/a.jar")
+        self.assertIsNone(self.records.get(self.ftp, "mods/a.jar.part"))
+        self.assertEqual(self.records.get(self.ftp, "mods/a.jar")["size"], 1)
+
+    def test_part_records(self):
+        source = {"size": 10, "sha256": "aa"}
+        self.records.put_part(self.ftp, "mods/a.jar.part", source)
+        self.assertEqual(self.records.get_part(self.ftp, "mods/a.jar.part"), source)
+        self.assertIsNone(self.records.get_part(self.ftp, "mods/b.jar.part"))
+
+
+class SkipUploadTest(FTPTestCase):
+    def test_skip_by_recorded_hash(self):
+        src = self.local_file("mod.jar", b"content")
+        self.fs.send_file(src, "mods/mod.jar")
+        self.fs.send_file(src, "mods/mod.jar", force=True)
+        self.assertEqual(len(self.stored("mods/mod.jar")), 1)
+        self.assertEqual(self.fs.skipped, 1)
+        # The records are saved on close, and trusted by the next run
+        self.fs.close()
+        fs = self.open_fs()
+        fs.send_file(src, "mods/mod.jar", force=True)
+        self.assertEqual(len(self.stored("mods/mod.jar")), 1)
+        self.assertEqual(fs.skipped, 1)
+
+    def test_same_size_other_content_is_uploaded(self):
+        self.fs.send_file(self.local_file("a.jar", b"aaaa"), "mods/mod.jar")
+        self.fs.send_file(self.local_file("b.jar", b"bbbb"), "mods/mod.jar", force=True)
+        self.assertEqual(self.server.files["mods/mod.jar"], b"bbbb")
+        self.assertEqual(self.fs.skipped, 0)
+
+    def test_other_size_is_uploaded(self):
+        self.server.dirs.add("mods")
+        self.server.files["mods/mod.jar"] = bytearray(b"old")
+        src = self.local_file("mod.jar", b"new!")
+        self.fs.send_file(src, "mods/mod.jar", force=True)
+        self.assertEqual(self.server.files["mods/mod.jar"], b"new!")
+
+    def test_unknown_content_is_uploaded(self):
+        # Same size, but nothing tells it is the same content
+        self.server.dirs.add("mods")
+        self.server.files["mods/mod.jar"] = bytearray(b"content")
+        src = self.local_file("mod.jar", b"content")
+        self.fs.send_file(src, "mods/mod.jar", force=True)
+        self.assertEqual(len(self.stored("mods/mod.jar.part")), 1)
+        self.assertEqual(self.fs.skipped, 0)
+
+
+class ServerHashSkipTest(FTPTestCase):
+    features = ("XSHA256",)
+
+    def test_skip_by_server_hash(self):
+        self.server.dirs.add("mods")
+        self.server.files["mods/mod.jar"] = bytearray(b"content")
+        src = self.local_file("mod.jar", b"content")
+        self.fs.send_file(src, "mods/mod.jar", force=True)
+        self.assertIn("XSHA256 mods/mod.jar", self.server.commands)
+        self.assertEqual(self.stored("mods/mod.jar"), [])
+        self.assertEqual(self.fs.skipped, 1)
+
+
+class ResumeTestCase(FTPTestCase):
+    """
+    Uploads files of more than RESUMABLE_SIZE
+    """
+
+    content = bytes(range(64))
+
+    def setUp(self):
+        patcher = mock.patch.object(ftp, "RESUMABLE_SIZE", 16)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+        self.src = self.local_file("big.jar", self.content)
+
+    def check_uploaded(self):
+        self.assertEqual(self.server.files["mods/big.jar"], self.content)
+        self.assertNotIn("mods/big.jar.part", self.server.files)
+
+    def record(self, path: str):
+        return self.fs.hash_records.get(self.server.connect(), path)
+
+
+class ResumeTest(ResumeTestCase):
+    features = ("REST STREAM",)
+
+    def test_resume_with_rest(self):
+        self.server.break_after, self.server.breaks = 20, 1
+        self.fs.send_file(self.src, "mods/big.jar")
+        self.check_uploaded()
+        self.assertEqual(
+            self.stored("mods/big.jar.part"),
+            ["STOR mods/big.jar.part", "REST 20, STOR mods/big.jar.part"],
+        )
+        # The server can't confirm the resumed content, its hash isn't recorded
+        self.assertIsNone(self.record("mods/big.jar"))
+
+    def test_resume_across_runs(self):
+        self.server.break_after = 20
+        with self.assertRaises(OSError):
+            self.fs.send_file(self.src, "mods/big.jar")
+        # Each attempt resumed the previous one
+        self.assertEqual(len(self.server.files["mods/big.jar.part"]), 60)
+        self.server.break_after = None
+        self.fs.close()
+        self.server.commands.clear()
+        self.open_fs().send_file(self.src, "mods/big.jar")
+        self.check_uploaded()
+        self.assertEqual(
+            self.stored("mods/big.jar.part"), ["REST 60, STOR mods/big.jar.part"]
+        )
+
+    def test_stale_part_is_discarded(self):
+        self.server.dirs.add("mods")
+        self.server.files["mods/big.jar.part"] = bytearray(b"something else")
+        self.fs.send_file(self.src, "mods/big.jar")
+        self.check_uploaded()
+        self.assertIn("DELE mods/big.jar.part", self.server.commands)
+        self.assertEqual(self.stored("mods/big.jar.part"), ["STOR mods/big.jar.part"])
+
+
+class AppendResumeTest(ResumeTestCase):
+    def test_resume_with_appe(self):
+        self.server.break_after, self.server.breaks = 20, 1
+        self.fs.send_file(self.src, "mods/big.jar")
+        self.check_uploaded()
+        self.assertEqual(
+            self.stored("mods/big.jar.part"),
+            ["STOR mods/big.jar.part", "APPE mods/big.jar.part"],
+        )
+
+
+class ConfirmedResumeTest(ResumeTestCase):
+    features = ("REST STREAM", "XSHA256")
+
+    def test_resumed_hash_is_recorded(self):
+        self.server.break_after, self.server.breaks = 20, 1
+        self.fs.send_file(self.src, "mods/big.jar")
+        self.check_uploaded()
+        self.assertIn("XSHA256 mods/big.jar.part", self.server.commands)
+        self.assertEqual(
+            self.record("mods/big.jar")["hashes"]["sha256"],
+            hashlib.sha256(self.content).hexdigest(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests of the retry policy and circuit breaker of the API requests, against scripted
+answers of the fake Curse server
+
+Part of the Minecraft Pack Manager utility (mpm)
+"""
+# Standard library import
+import time
+import unittest
+from unittest import mock
+
+# Local import
+from mc_pack_manager import network
+from mc_pack_manager.network import ratelimit
+from mc_pack_manager.network.fakeserver import FakeCurseServer, Fixtures
+
+
+class _RecordingPolicy(network.RetryPolicy):
+    """
+    Retry policy recording its delays instead of sleeping
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("jitter", 0.0)
+        super().__init__(**kwargs)
+        self.delays = []
+
+    def sleep(self, delay: float):
+        self.delays.append(delay)
+
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeCurseServer(Fixtures(count=2)).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.addonID = next(iter(self.server.fixtures.addons))
+        self.policy = _RecordingPolicy()
+        self.breaker = network.CircuitBreaker()
+        for name, value in (
+            ("ROOT", self.server.root),
+            ("RETRY_POLICY", self.policy),
+            ("CIRCUIT_BREAKER", self.breaker),
+        ):
+            patcher = mock.patch.object(network.TwitchAPI, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        ratelimit.configure(api_rate=None, cdn_rate=None)
+        self.addCleanup(ratelimit.close)
+
+    def tearDown(self):
+        with network.TwitchAPI.CACHE_LOCK:
+            network.TwitchAPI.MOD_CACHE.clear()
+
+    def test_not_found_is_not_retried(self):
+        self.server.script("get_addon", 404, repeat=True)
+        with self.assertRaises(network.RequestFailedError) as context:
+            network.TwitchAPI.get_addon_info(self.addonID)
+        self.assertEqual(context.exception.status, 404)
+        self.assertEqual(self.server.requests["get_addon"], 1)
+        self.assertEqual(self.policy.delays, [])
+
+    def test_retry_after_is_honoured(self):
+        self.server.script("get_addon", (429, {"Retry-After": "7"}))
+        info = network.TwitchAPI.get_addon_info(self.addonID)
+        self.assertEqual(info["id"], self.addonID)
+        self.assertEqual(self.server.requests["get_addon"], 2)
+        self.assertEqual(self.policy.delays, [7.0])
+
+    def test_backoff_is_capped(self):
+        self.policy.backoff_base = 1.0
+        self.policy.backoff_cap = 3.0
+        self.server.script("get_addon", *[503] * 5)
+        network.TwitchAPI.get_addon_info(self.addonID)
+        self.assertEqual(self.server.requests["get_addon"], 6)
+        self.assertEqual(self.policy.delays, [1.0, 2.0, 3.0, 3.0, 3.0])
+
+    def test_breaker_opens_and_half_opens(self):
+        self.policy.max_attempts = 2
+        self.breaker.failure_threshold = 2
+        self.breaker.reset_timeout = 0.2
+        self.server.script("get_addon", 503, 503, 503)
+        with self.assertRaises(network.RequestFailedError):
+            network.TwitchAPI.get_addon_info(self.addonID)
+        # Open: fails without contacting the server
+        with self.assertRaises(network.CircuitOpenError):
+            network.TwitchAPI.get_addon_info(self.addonID)
+        self.assertEqual(self.server.requests["get_addon"], 2)
+        time.sleep(0.25)
+        # Half-open: a single trial request, which fails and opens it again
+        with self.assertRaises(network.CircuitOpenError):
+            network.TwitchAPI.get_addon_info(self.addonID)
+        self.assertEqual(self.server.requests["get_addon"], 3)
+        time.sleep(0.25)
+        # The next trial succeeds and closes it
+        info = network.TwitchAPI.get_addon_info(self.addonID)
+        self.assertEqual(info["id"], self.addonID)
+        self.assertEqual(self.server.requests["get_addon"], 4)
+        self.assertEqual(self.breaker.opened, {})
+
+
+if __name__ == "__main__":
+    unittest.main()